@@ -0,0 +1,216 @@
+"""Optional ASGI front end for the read-heavy endpoints.
+
+    pip install "sqlalchemy[asyncio]" starlette a2wsgi uvicorn aiosqlite   # asyncpg for PostgreSQL
+    FLASK_APP=server flask db-upgrade
+    AUTO_MIGRATE=false uvicorn asgi:app --workers 2
+
+Migrations run once, before the workers start, as gunicorn.conf.py does
+for wsgi.py. Left on, AUTO_MIGRATE has every worker take the migration
+lock in turn at startup, which is safe but serializes their start.
+
+GET /library, /customers and /transactions are served from an async
+SQLAlchemy engine, so slow or idle clients wait on the event loop instead of
+each pinning a WSGI worker thread. They take the same filters and paging
+parameters as the Flask routes. GET /events is served here too, from the
+shared changes table, so every worker sees every other worker's writes.
+Every other request is handed to the Flask app from server.py, which also
+supplies the models, filters, serializers and configuration.
+"""
+import asyncio
+import contextlib
+
+from a2wsgi import WSGIMiddleware
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+from server import (Book, Change, Customer, EventBus, Transaction, book_filters, book_to_dict,
+                    create_app, customer_filters, customer_to_dict, db, decode_cursor,
+                    parse_limit, select_books, select_customers, select_transactions,
+                    split_page, sqlite_pragma_listener, transaction_filters,
+                    transaction_to_dict)
+
+ASYNC_DRIVERS = {'sqlite': 'sqlite+aiosqlite', 'postgresql': 'postgresql+asyncpg'}
+
+flask_app = create_app()
+
+def create_engine_from_flask():
+    # take the url flask-sqlalchemy actually resolved (relative sqlite paths
+    # point into the instance folder) and swap in the async driver
+    with flask_app.app_context():
+        url = db.engine.url
+    backend = url.get_backend_name()
+    options = {} if backend == 'sqlite' else dict(flask_app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    engine = create_async_engine(url.set(drivername=ASYNC_DRIVERS[backend]), **options)
+    if backend == 'sqlite':
+        event.listen(engine.sync_engine, 'connect',
+                     sqlite_pragma_listener(flask_app.config['SQLITE_PRAGMAS']))
+    return engine
+
+engine = create_engine_from_flask()
+
+class LibraryJSONResponse(JSONResponse):
+    # same encoder as the flask routes, which also knows how to write dates
+    def render(self, content):
+        return flask_app.json.dumps(content).encode('utf-8')
+
+class ChangeFeed(EventBus):
+    """The /events bus for this process, fed from the database instead of
+    from commit_changes(). A single task polls the changes table, which every
+    process writes to, so a subscriber hears about writes from any worker.
+    The poller stops when the last subscriber leaves."""
+    queue_class = asyncio.Queue
+    queue_full = asyncio.QueueFull
+
+    def __init__(self, engine, interval=1.0, queue_size=100, batch_size=1000):
+        super().__init__(queue_size)
+        self.engine = engine
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task = None
+
+    def subscribe(self, limit=None):
+        subscription = super().subscribe(limit)
+        if subscription is not None and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._poll())
+        return subscription
+
+    async def _poll(self):
+        async with self.engine.connect() as conn:
+            last_seq = (await conn.execute(select(func.max(Change.seq)))).scalar() or 0
+        while self.subscriber_count():
+            await asyncio.sleep(self.interval)
+            try:
+                async with self.engine.connect() as conn:
+                    while True:
+                        changes = (await conn.execute(
+                            select(Change.seq, Change.table_name, Change.row_id, Change.op)
+                            .where(Change.seq > last_seq).order_by(Change.seq)
+                            .limit(self.batch_size))).all()
+                        for change in changes:
+                            last_seq = change.seq
+                            self.publish((change.seq, change.table_name,
+                                          {'id': change.row_id, 'op': change.op}))
+                        if len(changes) < self.batch_size:
+                            break
+            except Exception as e:
+                flask_app.logger.error(f'Error polling changes: {str(e)}')
+
+change_feed = ChangeFeed(engine,
+                         interval=flask_app.config['EVENT_POLL_INTERVAL'],
+                         queue_size=flask_app.config['EVENT_QUEUE_SIZE'],
+                         batch_size=flask_app.config['STREAM_BATCH_SIZE'])
+
+async def get_books(request):
+    args = request.query_params
+    try:
+        # parse_limit() and the ?ids= filter read their caps from the flask config
+        with flask_app.app_context():
+            limit = parse_limit(args)
+            stmt = select_books().where(*book_filters(args))
+        if args.get('after'):
+            (after_id,) = decode_cursor(args['after'], int)
+            stmt = stmt.where(Book.book_id > after_id)
+        stmt = stmt.order_by(Book.book_id)
+        if limit is not None:
+            stmt = stmt.limit(limit + 1)
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+
+    try:
+        async with AsyncSession(engine) as session:
+            books = (await session.execute(stmt)).all()
+    except Exception as e:
+        flask_app.logger.error(f'Error fetching books: {str(e)}')
+        return JSONResponse({'error': 'Failed to fetch books'}, status_code=500)
+
+    books, next_cursor = split_page(books, limit, lambda book: (book.book_id,))
+    headers = {'X-Next-Cursor': next_cursor} if next_cursor else {}
+    return LibraryJSONResponse([book_to_dict(book) for book in books], headers=headers)
+
+async def get_customers(request):
+    args = request.query_params
+    try:
+        with flask_app.app_context():
+            limit = parse_limit(args)
+            stmt = select_customers().where(*customer_filters(args))
+        if args.get('after'):
+            (after_id,) = decode_cursor(args['after'], int)
+            stmt = stmt.where(Customer.customer_id > after_id)
+        stmt = stmt.order_by(Customer.customer_id)
+        if limit is not None:
+            stmt = stmt.limit(limit + 1)
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+
+    try:
+        async with AsyncSession(engine) as session:
+            customers = (await session.execute(stmt)).all()
+    except Exception as e:
+        flask_app.logger.error(f'Error fetching customers: {str(e)}')
+        return JSONResponse({'error': 'Failed to fetch customers'}, status_code=500)
+
+    customers, next_cursor = split_page(customers, limit, lambda customer: (customer.customer_id,))
+    headers = {'X-Next-Cursor': next_cursor} if next_cursor else {}
+    return LibraryJSONResponse([customer_to_dict(customer) for customer in customers], headers=headers)
+
+async def get_transactions(request):
+    try:
+        with flask_app.app_context():
+            stmt = select_transactions().where(
+                *transaction_filters(request.query_params)).order_by(Transaction.transaction_id)
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+
+    try:
+        async with AsyncSession(engine) as session:
+            transactions = (await session.execute(stmt)).all()
+    except Exception as e:
+        flask_app.logger.error(f'Error fetching transactions: {str(e)}')
+        return JSONResponse({'error': 'Failed to fetch transactions'}, status_code=500)
+    return LibraryJSONResponse([transaction_to_dict(transaction) for transaction in transactions])
+
+async def stream_events(request):
+    """Same stream as the flask /events, but fed by change_feed, so it
+    carries every worker's writes and an idle client costs a queue rather
+    than a thread."""
+    subscription = change_feed.subscribe()
+    keepalive = flask_app.config['EVENT_KEEPALIVE']
+    dumps = flask_app.json.dumps
+
+    async def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            while not subscription.closed:
+                try:
+                    seq, name, data = await asyncio.wait_for(subscription.get(), keepalive)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                yield f'id: {seq}\nevent: {name}\ndata: {dumps(data)}\n\n'
+        finally:
+            change_feed.unsubscribe(subscription)
+
+    return StreamingResponse(generate(), media_type='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    yield
+    await engine.dispose()
+
+app = Starlette(
+    routes=[
+        Route('/library', get_books, methods=['GET']),
+        Route('/customers', get_customers, methods=['GET']),
+        Route('/transactions', get_transactions, methods=['GET']),
+        Route('/events', stream_events, methods=['GET']),
+        # writes, search, stats ... stay on the flask app
+        Mount('/', app=WSGIMiddleware(flask_app)),
+    ],
+    lifespan=lifespan,
+)
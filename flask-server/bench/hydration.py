@@ -0,0 +1,145 @@
+"""ORM hydration vs column-only selects on the /library and /transactions reads.
+
+    cd flask-server
+    python bench/hydration.py                     # 10k, 100k and 1M rows
+    python bench/hydration.py --rows 10000 100000
+
+For each size it seeds a scratch SQLite database with that many books and
+loans. It then builds the response dicts two ways. "orm" is the old query,
+which loads Book/Author/Genre (Transaction/Book/Customer) entities.
+"core" is select_books()/select_transactions() plus the serializers the
+routes use now. Times are the best of --repeat runs. "peak" is the most
+memory allocated at once while building the list. It comes from a separate
+run under tracemalloc. The 1M-row orm pass over /transactions needs more
+than 6 GB of RAM under tracemalloc.
+"""
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, HERE)
+
+from sqlalchemy import insert  # noqa: E402
+
+from server import (Author, Book, Customer, Genre, Transaction,  # noqa: E402
+                    book_to_dict, create_app, db, select_books, select_transactions,
+                    transaction_to_dict)
+
+
+def orm_books():
+    books = db.session.query(Book, Author, Genre).join(Author,
+        Book.author_id == Author.author_id).join(Genre,
+        Book.genre_id == Genre.genre_id).all()
+    return [
+        {
+            'book_id': book.Book.book_id,
+            'title': book.Book.title,
+            'author': {'first_name': book.Author.first_name, 'last_name': book.Author.last_name},
+            'genre': {'name': book.Genre.name},
+            'published_date': book.Book.published_date,
+            'price': book.Book.price,
+            'availability': book.Book.availability
+        }
+        for book in books
+    ]
+
+
+def core_books():
+    return [book_to_dict(book) for book in db.session.execute(select_books())]
+
+
+def orm_transactions():
+    transactions = db.session.query(Transaction, Book, Customer).join(Book,
+        Transaction.book_id == Book.book_id).join(Customer,
+        Transaction.customer_id == Customer.customer_id).all()
+    return [
+        {
+            'transaction_id': transaction.Transaction.transaction_id,
+            'book_id': transaction.Transaction.book_id,
+            'book_title': transaction.Book.title,
+            'customer_name': f'{transaction.Customer.first_name} {transaction.Customer.last_name}',
+            'customer_id': transaction.Transaction.customer_id,
+            'date_borrowed': transaction.Transaction.date_borrowed,
+            'date_returned': transaction.Transaction.date_returned,
+            'due_date': transaction.Transaction.due_date
+        }
+        for transaction in transactions
+    ]
+
+
+def core_transactions():
+    return [transaction_to_dict(transaction)
+            for transaction in db.session.execute(select_transactions())]
+
+
+def seed(rows):
+    day = datetime.date(2020, 1, 1)
+    db.session.execute(insert(Author), [
+        {'first_name': f'First{i}', 'last_name': 'Last'} for i in range(100)])
+    db.session.execute(insert(Genre), [{'name': f'genre{i}'} for i in range(10)])
+    db.session.execute(insert(Customer), [
+        {'first_name': 'Customer', 'last_name': f'{i}', 'email': f'customer{i}@example.com'}
+        for i in range(100)])
+    for start in range(0, rows, 50000):
+        chunk = range(start, min(start + 50000, rows))
+        db.session.execute(insert(Book), [
+            {'title': f'Title {i}', 'author_id': i % 100 + 1, 'genre_id': i % 10 + 1,
+             'published_date': day, 'price': 9.99, 'availability': False} for i in chunk])
+        db.session.execute(insert(Transaction), [
+            {'book_id': i + 1, 'customer_id': i % 100 + 1, 'date_borrowed': day,
+             'due_date': day + datetime.timedelta(days=14)} for i in chunk])
+    db.session.commit()
+
+
+def measure(build, repeat):
+    best = None
+    for _ in range(repeat):
+        db.session.remove()   # start from an empty identity map each time
+        started = time.perf_counter()
+        build()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    db.session.remove()
+    tracemalloc.start()
+    build()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    db.session.remove()
+    return best, peak
+
+
+def run(rows, repeat):
+    workdir = tempfile.mkdtemp(prefix='hydration-bench-')
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(workdir, 'library.sqlite3')}"})
+    with app.app_context():
+        seed(rows)
+        for name, orm, core in (('/library', orm_books, core_books),
+                                ('/transactions', orm_transactions, core_transactions)):
+            orm_time, orm_peak = measure(orm, repeat)
+            core_time, core_peak = measure(core, repeat)
+            print(f'{rows:>9,} {name:<14} '
+                  f'orm {orm_time:7.2f}s peak {orm_peak / 1e6:6.0f} MB | '
+                  f'core {core_time:7.2f}s peak {core_peak / 1e6:6.0f} MB | '
+                  f'{orm_time / core_time:.1f}x faster, {orm_peak / core_peak:.1f}x less memory',
+                  flush=True)
+        db.engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    for rows in args.rows:
+        run(rows, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
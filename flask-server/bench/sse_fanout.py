@@ -0,0 +1,149 @@
+"""Fan-out of /events to idle subscribers, served by asgi.py.
+
+    pip install "sqlalchemy[asyncio]" starlette a2wsgi uvicorn aiosqlite httpx
+    cd flask-server
+    python bench/sse_fanout.py --subscribers 1000 --writes 20 [--poll-interval 0.1]
+
+Starts uvicorn on a scratch SQLite database and opens N /events streams.
+Then it checks a book out and back in through the API, and times how long
+each write's events take to reach every subscriber. While the streams are
+open it also times plain GET /library requests, to show that idle
+subscribers don't tie up the server.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, HERE)
+
+
+def seed(url):
+    os.environ['DATABASE_URL'] = url
+    from server import create_app, db
+    app = create_app()
+    client = app.test_client()
+    assert client.post('/books', json={
+        'title': 'Bench', 'author_first_name': 'Frank', 'author_last_name': 'Herbert',
+        'genre_name': 'fiction', 'published_date': '2000-01-01', 'price': 10,
+        'availability': True}).status_code == 201
+    assert client.post('/customers', json={
+        'first_name': 'Ada', 'last_name': 'Lovelace', 'email': 'ada@example.com'}).status_code == 201
+    with app.app_context():
+        db.engine.dispose()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def subscriber(client, received, ready):
+    async with client.stream('GET', '/events') as response:
+        async for line in response.aiter_lines():
+            if line.startswith('retry:'):
+                ready.release()
+            elif line.startswith('id: '):
+                seq = int(line[4:])
+                count, _ = received.get(seq, (0, None))
+                received[seq] = (count + 1, time.perf_counter())
+
+
+async def wait_for(received, seqs, subscribers, timeout=30):
+    deadline = time.perf_counter() + timeout
+    while any(received.get(seq, (0,))[0] < subscribers for seq in seqs):
+        if time.perf_counter() > deadline:
+            raise SystemExit(f'events {seqs} did not reach every subscriber')
+        await asyncio.sleep(0.005)
+    return max(received[seq][1] for seq in seqs)
+
+
+async def run(base_url, subscribers, writes):
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    timeout = httpx.Timeout(60, read=None)
+    received = {}
+    ready = asyncio.Semaphore(0)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as streams, \
+            httpx.AsyncClient(base_url=base_url, timeout=timeout) as api:
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(subscriber(streams, received, ready))
+                 for _ in range(subscribers)]
+        for _ in range(subscribers):
+            await ready.acquire()
+        print(f'{subscribers} subscribers connected in {time.perf_counter() - started:.2f}s')
+        await asyncio.sleep(2)   # let the change feed take its watermark
+
+        reads = []
+        for _ in range(50):
+            started = time.perf_counter()
+            assert (await api.get('/library')).status_code == 200
+            reads.append(time.perf_counter() - started)
+        print(f'GET /library with the streams open: median {statistics.median(reads) * 1000:.1f} ms, '
+              f'max {max(reads) * 1000:.1f} ms')
+
+        latencies = []
+        last_seq = (await api.get('/changes')).json()['next']
+        for i in range(writes):
+            if i % 2 == 0:
+                response = await api.post('/transactions', json={
+                    'book_id': 1, 'customer_id': 1, 'date_borrowed': '2024-01-01'})
+            else:
+                # the scratch database starts empty, so loan n has id n
+                response = await api.post('/transactions/return',
+                                          json={'transaction_id': i // 2 + 1})
+            assert response.status_code in (200, 201), response.text
+            written = time.perf_counter()
+            # each write logs two changes: the transaction and the book
+            seqs = (last_seq + 1, last_seq + 2)
+            delivered = await wait_for(received, seqs, subscribers)
+            latencies.append(delivered - written)
+            last_seq += 2
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    print(f'write -> all {subscribers} subscribers: median {statistics.median(latencies) * 1000:.0f} ms, '
+          f'max {max(latencies) * 1000:.0f} ms (includes up to one poll interval of waiting)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--subscribers', type=int, default=1000)
+    parser.add_argument('--writes', type=int, default=20)
+    parser.add_argument('--poll-interval', default='1.0',
+                        help="server's EVENT_POLL_INTERVAL in seconds")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='sse-bench-')
+    url = f"sqlite:///{os.path.join(workdir, 'library.sqlite3')}"
+    seed(url)
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'asgi:app', '--port', str(port), '--log-level', 'warning'],
+        cwd=HERE, env=dict(os.environ, DATABASE_URL=url, EVENT_POLL_INTERVAL=args.poll_interval))
+    try:
+        base_url = f'http://127.0.0.1:{port}'
+        for _ in range(100):
+            try:
+                httpx.get(base_url + '/library')
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+        asyncio.run(run(base_url, args.subscribers, args.writes))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""Requests per second: `python server.py` (the dev server) vs gunicorn.
+
+    pip install gunicorn
+    cd flask-server
+    python bench/throughput.py --duration 10 --concurrency 8
+
+Seeds a scratch SQLite database. It then starts each server on it in turn:
+the Werkzeug dev server with debug on, as `python server.py` runs it, and
+`gunicorn -c gunicorn.conf.py wsgi:app`. Each path is hit from
+--concurrency client threads for --duration seconds. Every book is lent
+out once, and every other loan is returned. /transactions isn't paged, so
+that path serialises all --rows loans per request. The load generator
+runs on the same machine, so keep an eye on the core count it prints;
+on one or two cores the client competes with the server for CPU.
+"""
+import argparse
+import datetime
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, HERE)
+
+from sqlalchemy import insert  # noqa: E402
+
+from server import Author, Book, Customer, Genre, Transaction, create_app, db  # noqa: E402
+
+PATHS = ['/library?limit=50', '/customers?limit=50', '/books/1', '/transactions']
+
+
+def seed(url, rows):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': url})
+    day = datetime.date(2020, 1, 1)
+    with app.app_context():
+        db.session.execute(insert(Author), [
+            {'first_name': f'First{i}', 'last_name': 'Last'} for i in range(100)])
+        db.session.execute(insert(Genre), [{'name': f'genre{i}'} for i in range(10)])
+        db.session.execute(insert(Book), [
+            {'title': f'Title {i}', 'author_id': i % 100 + 1, 'genre_id': i % 10 + 1,
+             'published_date': day, 'price': 9.99, 'availability': i % 2 == 1} for i in range(rows)])
+        db.session.execute(insert(Customer), [
+            {'first_name': 'Customer', 'last_name': f'{i}', 'email': f'customer{i}@example.com'}
+            for i in range(rows)])
+        db.session.execute(insert(Transaction), [
+            {'book_id': i + 1, 'customer_id': i + 1, 'date_borrowed': day,
+             'date_returned': day + datetime.timedelta(days=7) if i % 2 else None,
+             'due_date': day + datetime.timedelta(days=14)} for i in range(rows)])
+        db.session.commit()
+        db.engine.dispose()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(base_url, process):
+    for _ in range(300):
+        if process.poll() is not None:
+            raise SystemExit(f'server exited with {process.returncode}')
+        try:
+            urllib.request.urlopen(base_url + '/books/1').read()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise SystemExit('server did not come up')
+
+
+def load(url, duration, concurrency):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        mine = []
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                urllib.request.urlopen(url).read()
+            except OSError:
+                with lock:
+                    errors[0] += 1
+                continue
+            mine.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99)] if latencies else float('nan')
+    return len(latencies) / elapsed, statistics.median(latencies), p99, errors[0]
+
+
+def bench(name, command, env, args):
+    port = free_port()
+    env = dict(env, BIND=f'127.0.0.1:{port}', PORT=str(port))
+    # own process group, so the dev server's reloader child goes down with it
+    process = subprocess.Popen(command, cwd=HERE, env=env, start_new_session=True,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        base_url = f'http://127.0.0.1:{port}'
+        wait_until_up(base_url, process)
+        for path in PATHS:
+            load(base_url + path, 1, args.concurrency)   # warm up
+            rps, p50, p99, errors = load(base_url + path, args.duration, args.concurrency)
+            print(f'{name:<10} {path:<24} {rps:8.0f} req/s  p50 {p50 * 1000:6.1f} ms  '
+                  f'p99 {p99 * 1000:6.1f} ms' + (f'  {errors} errors' if errors else ''),
+                  flush=True)
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='throughput-bench-')
+    url = f"sqlite:///{os.path.join(workdir, 'library.sqlite3')}"
+    seed(url, args.rows)
+    env = dict(os.environ, DATABASE_URL=url)
+    print(f'{os.cpu_count()} CPUs, gunicorn.conf.py defaults unless '
+          f'WEB_CONCURRENCY/GUNICORN_THREADS are set', flush=True)
+
+    dev_server = ('import os; from server import create_app; '
+                  "create_app().run(debug=True, port=int(os.environ['PORT']))")
+    bench('dev', [sys.executable, '-c', dev_server], env, args)
+    bench('gunicorn', [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+          env, args)
+
+
+if __name__ == '__main__':
+    main()
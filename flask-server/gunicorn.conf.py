@@ -0,0 +1,44 @@
+# gunicorn settings for the library API: gunicorn -c gunicorn.conf.py wsgi:app
+# Every value can be overridden from the environment without editing this file.
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+
+# the usual (2 x cores) + 1 processes, each with a few threads so requests
+# waiting on the database don't idle a core
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+
+# each /events stream pins one of those threads for as long as it is open,
+# so let streams take at most half of them; the workers inherit this.
+# many subscribers belong on asgi.py instead
+os.environ.setdefault('EVENT_MAX_SUBSCRIBERS', str(max(threads // 2, 1)))
+
+# workers build their own engine after the fork (see wsgi.py); preloading
+# would share one pool's sockets/file handles between processes
+preload_app = False
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+# keep idle client connections open a little longer
+keepalive = 5
+accesslog = os.environ.get('ACCESS_LOG')
+
+
+def on_starting(server):
+    # run migrations once in the master instead of racing in every worker
+    from server import create_app, db
+    app = create_app()
+    with app.app_context():
+        db.engine.dispose()
+    os.environ['AUTO_MIGRATE'] = 'false'
+
+
+def post_fork(server, worker):
+    # if someone turns preload_app on anyway, drop the inherited connections
+    # so the worker opens its own
+    import sys
+    if 'wsgi' in sys.modules:
+        from server import db
+        with sys.modules['wsgi'].app.app_context():
+            db.engine.dispose(close=False)
@@ -1,13 +1,142 @@
-from flask import Flask, jsonify, request
+from flask import Blueprint, Flask, Response, current_app, g, jsonify, make_response, request, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import text
+from sqlalchemy import bindparam, event, inspect, select, text, func, cast, case, table, column, insert, update, tuple_
+import base64
+import click
+import contextlib
+import csv
 import datetime
-
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///library.sqlite3'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-db = SQLAlchemy(app)
+import functools
+import hashlib
+import io
+import json
+import math
+import os
+import queue
+import sqlalchemy.exc
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib encoder is used instead
+    orjson = None
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+    import msvcrt
+
+db = SQLAlchemy()
+library = Blueprint('library', __name__, cli_group=None)
+
+def configure(app):
+    """Default settings; anything passed to create_app() overrides these."""
+    # DATABASE_URL picks the backend, e.g. postgresql://user:pw@host/library;
+    # without it we keep using the local sqlite file
+    database_url = os.environ.get('DATABASE_URL', 'sqlite:///library.sqlite3')
+    if database_url.startswith('postgres://'):
+        # heroku‑style urls use a scheme sqlalchemy no longer accepts
+        database_url = 'postgresql://' + database_url[len('postgres://'):]
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    if not database_url.startswith('sqlite'):
+        # pooled connections for a shared server database
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            'pool_size'    : int(os.environ.get('DB_POOL_SIZE', 5)),
+            'max_overflow' : int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+            'pool_timeout' : int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+            'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true',
+            'pool_recycle' : int(os.environ.get('DB_POOL_RECYCLE', 1800))
+        }
+    # hard cap on ?limit= so one request can't ask for the whole table
+    app.config['MAX_PAGE_SIZE'] = 1000
+    app.config['SEARCH_PAGE_SIZE'] = 50
+    # rows fetched per round trip (and written per chunk) when streaming
+    app.config['STREAM_BATCH_SIZE'] = 1000
+    # max bound parameters per IN (...) chunk when resolving names in bulk
+    app.config['BULK_LOOKUP_CHUNK'] = 500
+    # most ids accepted by one /transactions/batch or /transactions/return/batch call
+    app.config['MAX_BATCH_SIZE'] = 1000
+    # days a checkout may be kept; sets due_date when the loan is created
+    app.config['LOAN_PERIOD_DAYS'] = int(os.environ.get('LOAN_PERIOD_DAYS', 14))
+    # run pending migrations when the app starts; set AUTO_MIGRATE=false to
+    # leave upgrades to an explicit `flask db-upgrade`
+    app.config['AUTO_MIGRATE'] = os.environ.get('AUTO_MIGRATE', 'true').lower() == 'true'
+    # rows per committed batch when a migration backfills existing data
+    app.config['MIGRATION_BATCH_SIZE'] = 5000
+    # /library response cache: max distinct queries kept, and seconds before an
+    # entry expires (this bounds staleness from writes made by other processes)
+    app.config['LIBRARY_CACHE_SIZE'] = 256
+    app.config['LIBRARY_CACHE_TTL'] = 30
+    # author/genre name -> id caches for the book write paths. Those rows are
+    # never deleted by the API, so the TTL only matters after a migration
+    # folds duplicates together in another process.
+    app.config['NAME_CACHE_SIZE'] = 10000
+    app.config['NAME_CACHE_TTL'] = 3600
+    # /events: undelivered events buffered per subscriber before it is dropped,
+    # and seconds between keepalive comments on an idle stream
+    app.config['EVENT_QUEUE_SIZE'] = 100
+    app.config['EVENT_KEEPALIVE'] = 15
+    # streams one WSGI process will hold open; past this the route answers
+    # 503. Each pins a request thread, which the dev server starts freely but
+    # gunicorn has only a few of (gunicorn.conf.py lowers this to match)
+    app.config['EVENT_MAX_SUBSCRIBERS'] = int(os.environ.get('EVENT_MAX_SUBSCRIBERS', 100))
+    # seconds between asgi.py's polls of the changes table for its /events
+    app.config['EVENT_POLL_INTERVAL'] = float(os.environ.get('EVENT_POLL_INTERVAL', 1.0))
+
+    # applied to every new sqlite connection. WAL lets readers keep going while
+    # a checkout is being written; busy_timeout (ms) makes writers wait for the
+    # lock instead of failing with "database is locked".
+    app.config['SQLITE_PRAGMAS'] = {
+        'journal_mode': 'WAL',
+        'synchronous' : 'NORMAL',
+        'busy_timeout': 5000,
+        'cache_size'  : -64000,      # negative = KiB, so ~64 MB
+        'mmap_size'   : 268435456,   # 256 MB
+        'temp_store'  : 'MEMORY'
+    }
+
+def sqlite_pragma_listener(pragmas):
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+    return set_sqlite_pragmas
+
+class LibraryJSONProvider(DefaultJSONProvider):
+    """Encodes with orjson when it is installed and with the stdlib encoder
+    otherwise. Either way dates come out as ISO 8601 (YYYY-MM-DD) rather than
+    Flask's HTTP date format, so serializers pass date columns through as-is
+    and the formatting happens inside the encoder instead of once per row.
+    The stdlib path is set up to write the same bytes orjson does: UTF-8
+    rather than \\u escapes, and no spaces unless indenting."""
+    # dumps() arguments orjson can honour; anything else goes to the stdlib
+    orjson_kwargs = frozenset(['default', 'indent', 'separators', 'sort_keys', 'ensure_ascii'])
+    ensure_ascii = False
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, datetime.date):
+            return o.isoformat()
+        # Decimal -> str, dataclasses, uuids ... as flask does it
+        return DefaultJSONProvider.default(o)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or not self.orjson_kwargs.issuperset(kwargs) or kwargs.get('ensure_ascii'):
+            if not kwargs.get('indent'):
+                kwargs.setdefault('separators', (',', ':'))
+            return super().dumps(obj, **kwargs)
+        option = orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=kwargs.get('default', self.default), option=option).decode()
 
 class Book(db.Model):
     __tablename__ = 'books'
@@ -18,6 +147,10 @@ class Book(db.Model):
     published_date = db.Column(db.Date, nullable=False)
     price = db.Column(db.Float, nullable=False)
     availability = db.Column(db.Boolean, default=True)
+    __table_args__ = (
+        # "available books in genre X" without touching the other genres
+        db.Index('idx_books_genre_availability', 'genre_id', 'availability'),
+    )
 
 class Author(db.Model):
     # __tablename__ = 'authors'
@@ -30,14 +163,17 @@ class Author(db.Model):
     first_name = db.Column(db.String(100), nullable=False, index=True)
     last_name  = db.Column(db.String(100), nullable=False, index=True)
     __table_args__ = (
-        # composite index on (first_name, last_name)
-        db.Index('idx_authors_name', 'first_name', 'last_name'),
+        # one row per (first_name, last_name); the ON CONFLICT target of UPSERT_AUTHOR
+        db.Index('uq_authors_name', 'first_name', 'last_name', unique=True),
     )
 
 class Genre(db.Model):
     __tablename__ = 'genres'
     genre_id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
+    __table_args__ = (
+        db.Index('uq_genres_name', 'name', unique=True),
+    )
 
 class Customer(db.Model):
     __tablename__ = 'customers'
@@ -45,41 +181,394 @@ class Customer(db.Model):
     first_name = db.Column(db.String(100), nullable=False)
     last_name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(200), nullable=False)
+    __table_args__ = (
+        # one customer per address, compared case-insensitively (A-Z only
+        # on sqlite, see ASCII_LOWER); on sqlite it also serves the ?email=
+        # prefix lookup
+        db.Index('uq_customers_email', func.lower(email), unique=True),
+        # ?q= and ?email= prefix lookups (see starts_with()). postgres needs
+        # text_pattern_ops for LIKE 'x%' to seek an index under a non-C
+        # collation; sqlite's default BINARY collation seeks the plain ones
+        db.Index('idx_customers_email_prefix', func.lower(email).label('email_lower'),
+                 postgresql_ops={'email_lower': 'text_pattern_ops'}).ddl_if(dialect='postgresql'),
+        db.Index('idx_customers_first_name', func.lower(first_name).label('first_name_lower'),
+                 postgresql_ops={'first_name_lower': 'text_pattern_ops'}),
+        db.Index('idx_customers_last_name', func.lower(last_name).label('last_name_lower'),
+                 postgresql_ops={'last_name_lower': 'text_pattern_ops'}),
+    )
+
+class TableVersion(db.Model):
+    # one row per versioned table, bumped in the same transaction as every
+    # write so all workers agree on it. the list endpoints turn these into
+    # ETag / Last‑Modified headers.
+    __tablename__ = 'table_versions'
+    table_name  = db.Column(db.String(50), primary_key=True)
+    version     = db.Column(db.Integer, nullable=False, default=0)
+    modified_at = db.Column(db.DateTime, nullable=False)
+
+class Change(db.Model):
+    # append‑only change log read by /changes. seq is the client's watermark;
+    # autoincrement keeps sqlite from handing out a seq twice.
+    __tablename__ = 'changes'
+    seq        = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(50), nullable=False)
+    row_id     = db.Column(db.Integer, nullable=False)
+    op         = db.Column(db.String(10), nullable=False)   # insert, update or delete
+    changed_at = db.Column(db.DateTime, nullable=False)
+    __table_args__ = {'sqlite_autoincrement': True}
+
+class SchemaVersion(db.Model):
+    # one row per applied migration, see MIGRATIONS
+    __tablename__ = 'schema_version'
+    version     = db.Column(db.Integer, primary_key=True)
+    description = db.Column(db.String(200), nullable=False)
+    applied_at  = db.Column(db.DateTime, nullable=False)
 
 class Transaction(db.Model):
     __tablename__ = 'transactions'
     transaction_id = db.Column(db.Integer, primary_key=True)
     # book_id = db.Column(db.Integer, db.ForeignKey('books.book_id'), nullable=False)
     # customer_id = db.Column(db.Integer, db.ForeignKey('customers.customer_id'), nullable=False)
-    # add indexes on book_id & customer_id so lookups and joins on those are fast
-    book_id     = db.Column(db.Integer, db.ForeignKey('books.book_id'), nullable=False, index=True)
-    customer_id = db.Column(db.Integer, db.ForeignKey('customers.customer_id'), nullable=False, index=True)
+    # book_id & customer_id lookups and joins use the leading column of the
+    # history indexes below
+    book_id     = db.Column(db.Integer, db.ForeignKey('books.book_id'), nullable=False)
+    customer_id = db.Column(db.Integer, db.ForeignKey('customers.customer_id'), nullable=False)
     date_borrowed = db.Column(db.Date, nullable=False)
     date_returned = db.Column(db.Date, nullable=True)
+    # set at checkout; nullable only because sqlite can't add a NOT NULL
+    # column to an existing table (migration 8 backfills it)
+    due_date      = db.Column(db.Date, nullable=True)
+    __table_args__ = (
+        # partial index holding only open loans, so "not returned yet" reads
+        # (oldest first) never see the returned history
+        db.Index('idx_transactions_open_loans', 'date_borrowed', 'book_id', 'customer_id',
+                 sqlite_where=text('date_returned IS NULL'),
+                 postgresql_where=text('date_returned IS NULL')),
+        # loans in a date range
+        db.Index('idx_transactions_date_borrowed', 'date_borrowed'),
+        # one customer's / one book's loans, newest first (transaction_id
+        # breaks ties between loans made on the same day)
+        db.Index('idx_transactions_customer_history', 'customer_id', 'date_borrowed', 'transaction_id'),
+        db.Index('idx_transactions_book_history', 'book_id', 'date_borrowed', 'transaction_id'),
+        # /transactions/overdue: open loans only, in due order
+        db.Index('idx_transactions_overdue', 'due_date', 'transaction_id',
+                 sqlite_where=text('date_returned IS NULL'),
+                 postgresql_where=text('date_returned IS NULL')),
+    )
+
+class ResponseCache:
+    """Small thread‑safe LRU cache with a TTL, used for GET responses
+    (write endpoints call clear() after they commit) and for the author and
+    genre ids looked up by name."""
+
+    def __init__(self, maxsize=256, ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'size': len(self._entries), 'maxsize': self.maxsize}
+
+# sized from config in create_app()
+library_cache = ResponseCache()
+author_ids = ResponseCache()   # (first_name, last_name) -> author_id
+genre_ids = ResponseCache()    # name -> genre_id
+
+class EventBus:
+    """Fan‑out for /events. Each subscriber gets its own bounded queue;
+    publish() never blocks, and a subscriber whose queue is full is closed
+    rather than allowed to hold up the publisher. Events are (seq, table,
+    data) with seq from the changes table, so a client can resync from
+    /changes?since=<seq>. The Flask route uses thread queues; asgi.py
+    subclasses this with asyncio queues."""
+    queue_class = queue.Queue
+    queue_full = queue.Full
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, limit=None):
+        # None when `limit` subscribers are already connected
+        subscription = self.queue_class(maxsize=self.queue_size)
+        subscription.closed = False
+        with self._lock:
+            if limit is not None and len(self._subscribers) >= limit:
+                return None
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.put_nowait(event)
+            except self.queue_full:
+                # too far behind to catch up; it has to resync (e.g. via /changes)
+                subscription.closed = True
+                self.unsubscribe(subscription)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+event_bus = EventBus()
+
+def cached_response(cache):
+    """Serve successful JSON responses from `cache`, keyed by the query string
+    and the table versions @versioned read for this request (so it has to sit
+    under @versioned). Writes made by another worker bump those versions and
+    with them the key, so a stale body is never served under a fresh ETag.
+    Streamed responses are passed straight through."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            versions = g.get('table_versions')
+            if stream_requested() or versions is None:
+                return view(*args, **kwargs)
+            key = (request.path, tuple(sorted(request.args.items(multi=True))), versions)
+            hit = cache.get(key)
+            if hit is not None:
+                body, headers = hit
+                response = Response(body, mimetype='application/json', headers=headers)
+                response.headers['X-Cache'] = 'HIT'
+                return response
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                headers = [(k, v) for k, v in response.headers if k == 'X-Next-Cursor']
+                cache.set(key, (response.get_data(), headers))
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+VERSIONED_TABLES = ('books', 'customers', 'transactions')
+
+def utcnow():
+    # naive utc, which is what the DateTime columns store
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+def init_table_versions():
+    existing = {name for (name,) in db.session.query(TableVersion.table_name)}
+    now = utcnow()
+    for name in VERSIONED_TABLES:
+        if name not in existing:
+            db.session.add(TableVersion(table_name=name, version=0, modified_at=now))
+    db.session.commit()
 
-@app.route('/books', methods=['POST'])
+CHANGE_LOG_LOCK_ID = 348349
+
+def lock_change_log():
+    """/changes hands out changes.seq as a watermark, so seq order has to be
+    commit order. On postgres a sequence value is drawn at insert but only
+    becomes visible at commit, and a later seq committing first would let a
+    client skip the earlier one. A transaction-scoped advisory lock taken
+    before the first change-log insert serializes those writers until they
+    commit. (sqlite only ever has one writer, so there's nothing to do.)"""
+    if db.engine.dialect.name != 'postgresql':
+        return
+    session = db.session()
+    transaction = session.get_transaction()
+    if transaction is None or session.info.get('change_log_locked') is not transaction:
+        session.execute(text('SELECT pg_advisory_xact_lock(:id)'), {'id': CHANGE_LOG_LOCK_ID})
+        session.info['change_log_locked'] = session.get_transaction()
+
+def record_change(table_name, row_id, op):
+    # call before commit_changes() so the entry commits with the write itself
+    lock_change_log()
+    change = Change(table_name=table_name, row_id=row_id, op=op, changed_at=utcnow())
+    db.session.add(change)
+    db.session.info.setdefault('pending_events', []).append(change)
+
+def commit_changes(*tables):
+    """Commit the current session, bumping the version of each changed table
+    in the same transaction, drop cached listings that depend on it and
+    publish the recorded changes to /events subscribers."""
+    # taken before committing so a failed commit can't leak its events later
+    pending = db.session.info.pop('pending_events', [])
+    new_ids = db.session.info.pop('pending_ids', [])
+    if pending:
+        # flushed first so each event can carry its change's seq
+        db.session.flush()
+        pending = [(c.seq, c.table_name, {'id': c.row_id, 'op': c.op}) for c in pending]
+    db.session.execute(
+        update(TableVersion).where(TableVersion.table_name.in_(tables)).values(
+            version=TableVersion.version + 1,
+            modified_at=utcnow())
+    )
+    db.session.commit()
+    if 'books' in tables:
+        library_cache.clear()
+    for cache, key, value in new_ids:
+        cache.set(key, value)
+    for change in pending:
+        event_bus.publish(change)
+
+def versioned(*tables):
+    """Conditional GET for a list endpoint built from `tables`. The strong
+    ETag is derived from the table versions plus the request's query string
+    and Accept header, so a matching If‑None‑Match (or an If‑Modified‑Since
+    not older than the last write) returns 304 without running the view.
+
+    HTTP dates only have whole seconds, so Last‑Modified is the last write
+    rounded up to the next second, and it is left off while that second is
+    still running: a second write inside it would carry the same date, and
+    a client revalidating with it would get a 304 for stale data."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            rows = db.session.query(TableVersion.table_name, TableVersion.version,
+                TableVersion.modified_at).filter(TableVersion.table_name.in_(tables)).all()
+            if len(rows) != len(tables):
+                # versions not initialised yet, so we can't vouch for anything
+                return view(*args, **kwargs)
+
+            # also the cache key for @cached_response further down
+            g.table_versions = tuple(sorted((row.table_name, row.version) for row in rows))
+            key = '|'.join([
+                request.path,
+                repr(sorted(request.args.items(multi=True))),
+                request.headers.get('Accept', ''),
+                repr(list(g.table_versions))
+            ])
+            etag = hashlib.sha1(key.encode()).hexdigest()
+            modified_at = max(row.modified_at for row in rows)
+            last_modified = modified_at.replace(microsecond=0, tzinfo=datetime.timezone.utc)
+            if modified_at.microsecond:
+                last_modified += datetime.timedelta(seconds=1)
+            settled = last_modified <= utcnow().replace(tzinfo=datetime.timezone.utc)
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            else:
+                since = request.if_modified_since
+                not_modified = since is not None and last_modified <= since
+            if not_modified:
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            if settled:
+                response.last_modified = last_modified
+            # always revalidate, which is cheap now, instead of guessing a max‑age
+            response.cache_control.no_cache = True
+            response.vary.add('Accept')
+            return response
+        return wrapper
+    return decorator
+
+@library.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify({'library': library_cache.stats(),
+                    'authors': author_ids.stats(),
+                    'genres': genre_ids.stats(),
+                    'event_subscribers': event_bus.subscriber_count()}), 200
+
+# bind the flag rather than writing TRUE/FALSE so every backend gets a
+# proper boolean (older sqlite has no TRUE/FALSE keywords)
+SET_AVAILABILITY = text("UPDATE books SET availability = :available WHERE book_id = :book_id")
+CHECKOUT_BOOK = text("""
+    UPDATE books
+       SET availability = :unavailable
+     WHERE book_id = :book_id
+       AND availability = :available
+""")
+
+# insert-if-missing in one statement; the unique indexes make concurrent
+# requests for the same new name safe. RETURNING only yields a row when this
+# statement did the insert (sqlite >= 3.35 and postgres both support it).
+UPSERT_AUTHOR = text("""
+    INSERT INTO authors (first_name, last_name)
+    VALUES (:first_name, :last_name)
+    ON CONFLICT (first_name, last_name) DO NOTHING
+    RETURNING author_id
+""")
+UPSERT_GENRE = text("""
+    INSERT INTO genres (name)
+    VALUES (:name)
+    ON CONFLICT (name) DO NOTHING
+    RETURNING genre_id
+""")
+
+def remember_id(cache, key, value):
+    # cached by commit_changes() once the insert has committed, so a rollback
+    # can't leave an id in the cache that was never written
+    db.session.info.setdefault('pending_ids', []).append((cache, key, value))
+
+def resolve_author(first_name, last_name):
+    key = (first_name, last_name)
+    author_id = author_ids.get(key)
+    if author_id is not None:
+        return author_id
+    params = {'first_name': first_name, 'last_name': last_name}
+    author_id = db.session.execute(UPSERT_AUTHOR, params).scalar()
+    if author_id is not None:
+        remember_id(author_ids, key, author_id)
+    else:
+        # already there (and committed), so nothing was returned
+        author_id = db.session.execute(text(
+            'SELECT author_id FROM authors WHERE first_name = :first_name AND last_name = :last_name'
+        ), params).scalar()
+        author_ids.set(key, author_id)
+    return author_id
+
+def resolve_genre(name):
+    genre_id = genre_ids.get(name)
+    if genre_id is not None:
+        return genre_id
+    genre_id = db.session.execute(UPSERT_GENRE, {'name': name}).scalar()
+    if genre_id is not None:
+        remember_id(genre_ids, name, genre_id)
+    else:
+        genre_id = db.session.execute(text(
+            'SELECT genre_id FROM genres WHERE name = :name'
+        ), {'name': name}).scalar()
+        genre_ids.set(name, genre_id)
+    return genre_id
+
+@library.route('/books', methods=['POST'])
 def add_book():
     try:
         data = request.json
-        # first, ensure author exists (by ORM or text). Here ORM for simplicity:
-        author = Author.query.filter_by(
-            first_name=data['author_first_name'],
-            last_name =data['author_last_name']
-        ).first()
-        if not author:
-            author = Author(
-                first_name=data['author_first_name'],
-                last_name =data['author_last_name']
-            )
-            db.session.add(author)
-            db.session.commit()
-
-        # then genre
-        genre = Genre.query.filter_by(name=data['genre_name']).first()
-        if not genre:
-            genre = Genre(name=data['genre_name'])
-            db.session.add(genre)
-            db.session.commit()
+        # author and genre are created on the fly, in the same transaction as the book
+        author_id = resolve_author(data['author_first_name'], data['author_last_name'])
+        genre_id = resolve_genre(data['genre_name'])
 
         # now insert the book row via prepared statement
         inserted_date = datetime.datetime.strptime(
@@ -90,23 +579,190 @@ def add_book():
               (title, author_id, genre_id, published_date, price, availability)
             VALUES
               (:title, :author_id, :genre_id, :published_date, :price, :availability)
+            RETURNING book_id
         """)
-        db.session.execute(stmt, {
+        book_id = db.session.execute(stmt, {
             'title'         : data['title'],
-            'author_id'     : author.author_id,
-            'genre_id'      : genre.genre_id,
+            'author_id'     : author_id,
+            'genre_id'      : genre_id,
             'published_date': inserted_date,
             'price'         : float(data['price']),
             'availability'  : bool(data['availability'])
-        })
-        db.session.commit()
+        }).scalar()
+        record_change('books', book_id, 'insert')
+        commit_changes('books')
         return jsonify({'message': 'Book added successfully'}), 201
 
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
 
-@app.route('/books/<int:book_id>', methods=['PUT'])
+BOOK_FIELDS = ('title', 'author_first_name', 'author_last_name',
+               'genre_name', 'published_date', 'price')
+
+# text fields and the column that bounds their length
+BOOK_TEXT_COLUMNS = {
+    'title'            : Book.title,
+    'author_first_name': Author.first_name,
+    'author_last_name' : Author.last_name,
+    'genre_name'       : Genre.name,
+}
+
+def parse_book_row(row):
+    """Validate one import row up front, so a bad row is reported on its own
+    instead of failing the database insert for the whole batch."""
+    if not isinstance(row, dict):
+        raise ValueError('expected an object with the book fields')
+    missing = [f for f in BOOK_FIELDS if row.get(f) in (None, '')]
+    if missing:
+        raise ValueError('missing ' + ', '.join(missing))
+    for field, col in BOOK_TEXT_COLUMNS.items():
+        if not isinstance(row[field], str):
+            raise ValueError(f'{field} must be a string')
+        if len(row[field]) > col.type.length:
+            raise ValueError(f'{field} must be at most {col.type.length} characters')
+    try:
+        price = float(row['price'])
+    except (TypeError, ValueError):
+        raise ValueError('price must be a number')
+    if not math.isfinite(price):
+        raise ValueError('price must be a finite number')
+    availability = row.get('availability', True)
+    if isinstance(availability, str):
+        # csv gives us strings; blank means the default (available)
+        availability = availability.strip().lower() not in ('false', '0', 'no')
+    return {
+        'title'         : row['title'],
+        'first_name'    : row['author_first_name'],
+        'last_name'     : row['author_last_name'],
+        'genre_name'    : row['genre_name'],
+        'published_date': parse_date(row['published_date'], 'published_date'),
+        'price'         : price,
+        'availability'  : bool(availability)
+    }
+
+def chunks(items, size):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def resolve_authors(pairs):
+    """Map (first_name, last_name) -> author_id, inserting the missing ones
+    in one executemany (skipping any a concurrent request just added)."""
+    size = current_app.config['BULK_LOOKUP_CHUNK']
+    ids = {}
+    def lookup(wanted):
+        for chunk in chunks(wanted, size):
+            for row in db.session.query(Author.author_id, Author.first_name, Author.last_name).filter(
+                    tuple_(Author.first_name, Author.last_name).in_(chunk)):
+                ids[(row.first_name, row.last_name)] = row.author_id
+                remember_id(author_ids, (row.first_name, row.last_name), row.author_id)
+    for pair in pairs:
+        author_id = author_ids.get(pair)
+        if author_id is not None:
+            ids[pair] = author_id
+    lookup([p for p in pairs if p not in ids])
+    missing = [p for p in pairs if p not in ids]
+    if missing:
+        db.session.execute(UPSERT_AUTHOR, [{'first_name': fn, 'last_name': ln} for fn, ln in missing])
+        lookup(missing)
+    return ids
+
+def resolve_genres(names):
+    size = current_app.config['BULK_LOOKUP_CHUNK']
+    ids = {}
+    def lookup(wanted):
+        for chunk in chunks(wanted, size):
+            for row in db.session.query(Genre.genre_id, Genre.name).filter(Genre.name.in_(chunk)):
+                ids[row.name] = row.genre_id
+                remember_id(genre_ids, row.name, row.genre_id)
+    for name in names:
+        genre_id = genre_ids.get(name)
+        if genre_id is not None:
+            ids[name] = genre_id
+    lookup([n for n in names if n not in ids])
+    missing = [n for n in names if n not in ids]
+    if missing:
+        db.session.execute(UPSERT_GENRE, [{'name': n} for n in missing])
+        lookup(missing)
+    return ids
+
+def import_books(rows):
+    """Insert many books in a single transaction. Invalid rows are skipped
+    and reported as {'row': n, 'error': msg} (n is 1‑based); the rest go in
+    with set‑based author/genre resolution and one executemany."""
+    parsed, errors = [], []
+    for n, row in enumerate(rows, start=1):
+        try:
+            parsed.append(parse_book_row(row))
+        except (ValueError, TypeError) as e:
+            errors.append({'row': n, 'error': str(e)})
+    if not parsed:
+        return 0, errors
+
+    author_map = resolve_authors({(r['first_name'], r['last_name']) for r in parsed})
+    genre_map = resolve_genres({r['genre_name'] for r in parsed})
+    # insertmanyvalues batches this and still hands back every new book_id
+    stmt = insert(Book).returning(Book.book_id)
+    book_ids = db.session.scalars(stmt, [
+        {
+            'title'         : r['title'],
+            'author_id'     : author_map[(r['first_name'], r['last_name'])],
+            'genre_id'      : genre_map[r['genre_name']],
+            'published_date': r['published_date'],
+            'price'         : r['price'],
+            'availability'  : r['availability']
+        }
+        for r in parsed
+    ]).all()
+    now = utcnow()
+    lock_change_log()
+    db.session.execute(insert(Change), [
+        {'table_name': 'books', 'row_id': book_id, 'op': 'insert', 'changed_at': now}
+        for book_id in book_ids
+    ])
+    commit_changes('books')
+    return len(parsed), errors
+
+@library.route('/books/bulk', methods=['POST'])
+def add_books_bulk():
+    """Accepts a JSON array of add_book payloads, a text/csv body, or a CSV
+    file uploaded as the multipart field 'file' (header row = field names)."""
+    try:
+        if 'file' in request.files:
+            stream = io.TextIOWrapper(request.files['file'].stream, encoding='utf-8-sig')
+            rows = csv.DictReader(stream)
+        elif request.mimetype == 'text/csv':
+            rows = csv.DictReader(io.StringIO(request.get_data(as_text=True)))
+        else:
+            rows = request.json
+            if not isinstance(rows, list):
+                return jsonify({'error': 'Expected a JSON array of books'}), 400
+
+        inserted, errors = import_books(rows)
+        status = 201 if inserted else 400
+        return jsonify({'inserted': inserted, 'errors': errors}), status
+
+    except sqlalchemy.exc.SQLAlchemyError as e:
+        # rows are validated before the insert, so this is the database
+        # itself; keep its SQL and parameters out of the response
+        db.session.rollback()
+        current_app.logger.error(f'Error importing books: {str(e)}')
+        return jsonify({'error': 'Failed to import books'}), 500
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+
+@library.cli.command('import-books')
+@click.argument('csv_file', type=click.File(encoding='utf-8-sig'))
+def import_books_command(csv_file):
+    """Bulk‑load books from a CSV file with add_book's field names as header."""
+    inserted, errors = import_books(csv.DictReader(csv_file))
+    for error in errors:
+        click.echo(f"row {error['row']}: {error['error']}", err=True)
+    click.echo(f'Imported {inserted} books ({len(errors)} rows skipped)')
+
+@library.route('/books/<int:book_id>', methods=['PUT'])
 def update_book(book_id):
     try:
         data = request.json
@@ -117,57 +773,10 @@ def update_book(book_id):
         ).date()
 
         # 2) find or insert the author
-        author_row = db.session.execute(
-            text("""
-              SELECT author_id 
-                FROM authors 
-               WHERE first_name = :fn 
-                 AND last_name  = :ln
-            """),
-            {'fn': data['author_first_name'], 'ln': data['author_last_name']}
-        ).fetchone()
-
-        if author_row:
-            author_id = author_row.author_id
-        else:
-            # insert new author
-            db.session.execute(
-                text("""
-                  INSERT INTO authors (first_name, last_name)
-                  VALUES (:fn, :ln)
-                """),
-                {'fn': data['author_first_name'], 'ln': data['author_last_name']}
-            )
-            db.session.commit()
-            # then re‑fetch its id
-            author_id = db.session.execute(
-                text("""
-                  SELECT author_id 
-                    FROM authors 
-                   WHERE first_name = :fn 
-                     AND last_name  = :ln
-                """),
-                {'fn': data['author_first_name'], 'ln': data['author_last_name']}
-            ).scalar()
+        author_id = resolve_author(data['author_first_name'], data['author_last_name'])
 
         # 3) find or insert the genre
-        genre_row = db.session.execute(
-            text("SELECT genre_id FROM genres WHERE name = :name"),
-            {'name': data['genre_name']}
-        ).fetchone()
-
-        if genre_row:
-            genre_id = genre_row.genre_id
-        else:
-            db.session.execute(
-                text("INSERT INTO genres (name) VALUES (:name)"),
-                {'name': data['genre_name']}
-            )
-            db.session.commit()
-            genre_id = db.session.execute(
-                text("SELECT genre_id FROM genres WHERE name = :name"),
-                {'name': data['genre_name']}
-            ).scalar()
+        genre_id = resolve_genre(data['genre_name'])
 
         # 4) now update the book record
         stmt = text("""
@@ -189,11 +798,14 @@ def update_book(book_id):
             'availability'   : bool(data['availability']),
             'book_id'        : book_id
         })
-        db.session.commit()
-
         if result.rowcount == 0:
+            # nothing changed, so leave the table version (and every ETag) alone
+            db.session.rollback()
             return jsonify({'error': 'Book not found'}), 404
 
+        record_change('books', book_id, 'update')
+        commit_changes('books')
+
         return jsonify({'message': 'Book updated successfully'}), 200
 
     except Exception as e:
@@ -201,69 +813,494 @@ def update_book(book_id):
         return jsonify({'error': str(e)}), 400
 
 
-@app.route('/books/<int:book_id>', methods=['DELETE'])
+@library.route('/books/<int:book_id>', methods=['DELETE'])
 def delete_book(book_id):
     try:
         stmt = text("DELETE FROM books WHERE book_id = :book_id")
         result = db.session.execute(stmt, {'book_id': book_id})
-        db.session.commit()
-
         if result.rowcount == 0:
+            db.session.rollback()
             return jsonify({'error': 'Book not found'}), 404
+
+        record_change('books', book_id, 'delete')
+        commit_changes('books')
         return jsonify({'message': 'Book deleted successfully'}), 200
 
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
 
-@app.route('/library', methods=['GET'])
+def encode_cursor(*values):
+    # opaque keyset cursor: urlsafe base64 of the json‑encoded sort key
+    raw = json.dumps(list(values), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor, *types):
+    """Inverse of encode_cursor(); `types` is the expected type of each part,
+    so a cursor of the wrong shape is rejected rather than unpacked."""
+    padded = cursor + '=' * (-len(cursor) % 4)
+    try:
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except ValueError:
+        raise ValueError('Invalid cursor')
+    if (not isinstance(values, list) or len(values) != len(types)
+            or not all(isinstance(v, t) and not isinstance(v, bool) for v, t in zip(values, types))):
+        raise ValueError('Invalid cursor')
+    return values
+
+def split_page(rows, limit, key_fn):
+    """`rows` were fetched with limit + 1: the extra row only says there is
+    a next page. Returns (page, next_cursor), the cursor being
+    encode_cursor(*key_fn(last row)) or None on the last page."""
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(*key_fn(rows[-1]))
+
+def keyset_page(stmt, limit, key_fn):
+    # one page of an already filtered, ordered and cursor-seeked select
+    if limit is not None:
+        stmt = stmt.limit(limit + 1)
+    return split_page(db.session.execute(stmt).all(), limit, key_fn)
+
+def page_response(items, next_cursor):
+    response = jsonify(items)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+def parse_limit(args):
+    # None means "no limit" so the existing client keeps getting everything
+    limit = args.get('limit')
+    if limit is None or limit == '':
+        return None
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    return min(limit, current_app.config['MAX_PAGE_SIZE'])
+
+def contains(column, value):
+    # case‑insensitive substring match, same as the client's includes()
+    return func.lower(column).contains(value.lower(), autoescape=True)
+
+def parse_ids(args):
+    # ?ids=1,2,3 multi-get; one IN (...) on the primary key, capped like the
+    # batch endpoints
+    try:
+        ids = [int(i) for i in args['ids'].split(',') if i.strip()]
+    except ValueError:
+        raise ValueError('ids must be a comma-separated list of integer ids')
+    if not ids:
+        raise ValueError('ids must list at least one id')
+    if len(ids) > current_app.config['MAX_BATCH_SIZE']:
+        raise ValueError(f"at most {current_app.config['MAX_BATCH_SIZE']} ids per request")
+    return list(dict.fromkeys(ids))
+
+def book_filters(args):
+    # mirrors filteredBooks in client/src/App.js
+    criteria = []
+    if 'ids' in args:
+        criteria.append(Book.book_id.in_(parse_ids(args)))
+    if args.get('book_id'):
+        criteria.append(cast(Book.book_id, db.String).contains(args['book_id'], autoescape=True))
+    if args.get('title'):
+        criteria.append(contains(Book.title, args['title']))
+    if args.get('author'):
+        criteria.append(contains(Author.first_name + ' ' + Author.last_name, args['author'].strip()))
+    if args.get('genre'):
+        criteria.append(contains(Genre.name, args['genre']))
+    if args.get('availability'):
+        if args['availability'] not in ('true', 'false'):
+            raise ValueError("availability must be 'true' or 'false'")
+        criteria.append(Book.availability == (args['availability'] == 'true'))
+    return criteria
+
+# what sqlite's lower() does: A-Z only, everything else left alone. A python
+# casefold registered as a sql function would fold the rest, but the
+# expression indexes built on it would make the file unwritable from any
+# connection (the sqlite3 shell, a backup tool) that hasn't registered it
+ASCII_LOWER = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')
+
+def starts_with(column, prefix):
+    """Case‑insensitive prefix match on lower(column) that can seek the
+    lower(...) expression indexes. The prefix is folded the way the
+    database's lower() folds the column, and compared character by
+    character, never under a linguistic collation that would skip
+    punctuation ('john.' has to stay a prefix of 'john.smith')."""
+    if db.engine.dialect.name == 'sqlite':
+        # sqlite's LIKE is case-insensitive and can't use these indexes, so
+        # write it as a range; the BINARY collation orders by code point
+        prefix = prefix.translate(ASCII_LOWER)
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        return db.and_(func.lower(column) >= prefix, func.lower(column) < upper)
+    # postgres' lower() folds unicode like str.lower(), and LIKE 'x%'
+    # matches exactly and seeks the text_pattern_ops indexes
+    escaped = prefix.lower().replace('/', '//').replace('%', '/%').replace('_', '/_')
+    return func.lower(column).like(escaped + '%', escape='/')
+
+def customer_filters(args):
+    criteria = []
+    if 'ids' in args:
+        criteria.append(Customer.customer_id.in_(parse_ids(args)))
+    q = args.get('q', '').split()
+    if len(q) == 1:
+        # either name may start with a single word
+        criteria.append(db.or_(starts_with(Customer.first_name, q[0]),
+                               starts_with(Customer.last_name, q[0])))
+    elif q:
+        # "jane au" -> first name starting with jane, last name with au
+        criteria.append(starts_with(Customer.first_name, q[0]))
+        criteria.append(starts_with(Customer.last_name, ' '.join(q[1:])))
+    if args.get('email', '').strip():
+        criteria.append(starts_with(Customer.email, args['email'].strip()))
+    return criteria
+
+def parse_date(value, name):
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f'{name} must be a YYYY-MM-DD date')
+
+def transaction_filters(args):
+    # mirrors filteredTransactions in client/src/App.js
+    criteria = []
+    if 'ids' in args:
+        criteria.append(Transaction.transaction_id.in_(parse_ids(args)))
+    for name, col in (('transaction_id', Transaction.transaction_id),
+                      ('book_id', Transaction.book_id),
+                      ('customer_id', Transaction.customer_id)):
+        if args.get(name):
+            criteria.append(cast(col, db.String).contains(args[name], autoescape=True))
+    if args.get('date_borrowed'):
+        criteria.append(Transaction.date_borrowed == parse_date(args['date_borrowed'], 'date_borrowed'))
+    if args.get('date_returned'):
+        criteria.append(Transaction.date_returned == parse_date(args['date_returned'], 'date_returned'))
+    return criteria
+
+# the list endpoints select just the columns they serialize, as plain rows,
+# instead of hydrating Book/Author/Genre (or Transaction/Book/Customer)
+# instances into the identity map only to read a handful of attributes
+
+def select_books():
+    return select(
+        Book.book_id, Book.title,
+        Author.first_name.label('author_first_name'),
+        Author.last_name.label('author_last_name'),
+        Genre.name.label('genre_name'),
+        Book.published_date, Book.price, Book.availability
+    ).join(Author, Book.author_id == Author.author_id).join(Genre,
+        Book.genre_id == Genre.genre_id)
+
+def select_customers():
+    return select(Customer.customer_id, Customer.first_name, Customer.last_name, Customer.email)
+
+def select_transactions():
+    return select(
+        Transaction.transaction_id, Transaction.book_id,
+        Book.title.label('book_title'),
+        Customer.first_name.label('customer_first_name'),
+        Customer.last_name.label('customer_last_name'),
+        Transaction.customer_id, Transaction.date_borrowed, Transaction.date_returned,
+        Transaction.due_date
+    ).join(Book, Transaction.book_id == Book.book_id).join(Customer,
+        Transaction.customer_id == Customer.customer_id)
+
+def book_to_dict(book):
+    return {
+        'book_id': book.book_id,
+        'title': book.title,
+        'author': {'first_name': book.author_first_name, 'last_name': book.author_last_name},
+        'genre': {'name': book.genre_name},
+        'published_date': book.published_date,
+        'price': book.price,
+        'availability': book.availability
+    }
+
+def customer_to_dict(customer):
+    return {
+        'customer_id': customer.customer_id,
+        'first_name': customer.first_name,
+        'last_name': customer.last_name,
+        'email': customer.email
+    }
+
+def transaction_to_dict(transaction):
+    return {
+        'transaction_id': transaction.transaction_id,
+        'book_id': transaction.book_id,
+        'book_title': transaction.book_title,
+        'customer_name': f'{transaction.customer_first_name} {transaction.customer_last_name}',
+        'customer_id': transaction.customer_id,
+        'date_borrowed': transaction.date_borrowed,
+        'date_returned': transaction.date_returned,
+        'due_date': transaction.due_date
+    }
+
+def stream_requested():
+    # ndjson via the Accept header, or a chunked json array via ?stream=true
+    return (request.args.get('stream') == 'true'
+            or request.accept_mimetypes.best_match(
+                ['application/json', 'application/x-ndjson']) == 'application/x-ndjson')
+
+def stream_json(stmt, serialize):
+    """Write query results as they are fetched instead of building the whole
+    list first. Rows are pulled through a server‑side cursor in batches of
+    STREAM_BATCH_SIZE, so memory stays flat however big the table is."""
+    batch_size = current_app.config['STREAM_BATCH_SIZE']
+    ndjson = request.accept_mimetypes.best_match(
+        ['application/json', 'application/x-ndjson']) == 'application/x-ndjson'
+
+    def generate():
+        chunk = [] if ndjson else ['[']
+        first = True
+        for row in db.session.execute(stmt.execution_options(yield_per=batch_size)):
+            encoded = current_app.json.dumps(serialize(row))
+            if ndjson:
+                chunk.append(encoded + '\n')
+            else:
+                chunk.append(encoded if first else ',' + encoded)
+            first = False
+            if len(chunk) >= batch_size:
+                yield ''.join(chunk)
+                chunk = []
+        if not ndjson:
+            chunk.append(']')
+        if chunk:
+            yield ''.join(chunk)
+
+    mimetype = 'application/x-ndjson' if ndjson else 'application/json'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+def csv_requested():
+    return (request.args.get('format') == 'csv'
+            or request.accept_mimetypes.best_match(['application/json', 'text/csv']) == 'text/csv')
+
+def stream_csv(stmt, fields, serialize, filename):
+    """CSV counterpart of stream_json(): a header row of `fields`, then one
+    line per row written in batches of STREAM_BATCH_SIZE."""
+    batch_size = current_app.config['STREAM_BATCH_SIZE']
+
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fields, extrasaction='ignore')
+        writer.writeheader()
+        rows = 0
+        for row in db.session.execute(stmt.execution_options(yield_per=batch_size)):
+            writer.writerow(serialize(row))
+            rows += 1
+            if rows % batch_size == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    response = Response(stream_with_context(generate()), mimetype='text/csv')
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+@library.route('/library', methods=['GET'])
+@versioned('books')
+@cached_response(library_cache)
 def get_books():
     try:
-        books = db.session.query(Book, Author, Genre).join(Author, 
-            Book.author_id == Author.author_id).join(Genre, 
-            Book.genre_id == Genre.genre_id).all()
-
-        book_list = [
-            {
-                'book_id': book.Book.book_id,
-                'title': book.Book.title,
-                'author': {'first_name': book.Author.first_name, 'last_name': book.Author.last_name},
-                'genre': {'name': book.Genre.name},
-                'published_date': book.Book.published_date.strftime('%Y-%m-%d'),
-                'price': book.Book.price,
-                'availability': book.Book.availability
-            }
-            for book in books
-        ]
+        limit = parse_limit(request.args)
+        stmt = select_books().where(*book_filters(request.args))
+
+        # keyset paging on book_id: seek past the cursor instead of OFFSET
+        if request.args.get('after'):
+            (after_id,) = decode_cursor(request.args['after'], int)
+            stmt = stmt.where(Book.book_id > after_id)
+        stmt = stmt.order_by(Book.book_id)
+
+        if stream_requested():
+            # streamed responses are meant for full exports, so no cursor header
+            if limit is not None:
+                stmt = stmt.limit(limit)
+            return stream_json(stmt, book_to_dict)
+
+        books, next_cursor = keyset_page(stmt, limit, lambda book: (book.book_id,))
+        return page_response([book_to_dict(book) for book in books], next_cursor), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f'Error fetching books: {str(e)}')
+        return jsonify({'error': 'Failed to fetch books'}), 500
 
+# full‑text index over book titles and author names. it is a standalone
+# fts5 table keyed by book_id (rowid) and kept in sync by triggers, so the
+# raw text() writes above don't need to know about it.
+SEARCH_INDEX_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+        title, author,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+        INSERT INTO books_fts (rowid, title, author)
+        SELECT new.book_id, new.title, a.first_name || ' ' || a.last_name
+          FROM authors a
+         WHERE a.author_id = new.author_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+        DELETE FROM books_fts WHERE rowid = old.book_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE OF book_id, title, author_id ON books BEGIN
+        DELETE FROM books_fts WHERE rowid = old.book_id;
+        INSERT INTO books_fts (rowid, title, author)
+        SELECT new.book_id, new.title, a.first_name || ' ' || a.last_name
+          FROM authors a
+         WHERE a.author_id = new.author_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS authors_fts_au AFTER UPDATE OF first_name, last_name ON authors BEGIN
+        UPDATE books_fts
+           SET author = new.first_name || ' ' || new.last_name
+         WHERE rowid IN (SELECT book_id FROM books WHERE author_id = new.author_id);
+    END
+    """,
+]
+
+books_fts = table('books_fts', column('rowid'), column('rank'))
+
+def create_search_index():
+    if db.engine.dialect.name != 'sqlite':
+        # fts5 is sqlite only; search_books falls back to LIKE elsewhere
+        return
+    exists = db.session.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'books_fts'")
+    ).first()
+    for ddl in SEARCH_INDEX_DDL:
+        db.session.execute(text(ddl))
+    db.session.commit()
+    if not exists:
+        # first run against an existing catalog: index the books already there.
+        # the triggers are live by now, so skip rows they have already added.
+        run_in_batches(text("""
+            INSERT INTO books_fts (rowid, title, author)
+            SELECT b.book_id, b.title, a.first_name || ' ' || a.last_name
+              FROM books b
+              JOIN authors a ON a.author_id = b.author_id
+             WHERE b.book_id BETWEEN :lo AND :hi
+               AND b.book_id NOT IN (SELECT rowid FROM books_fts WHERE rowid BETWEEN :lo AND :hi)
+        """), 'books', 'book_id')
+
+def fts_query(q):
+    # every word becomes a quoted prefix term so "dun herb" matches "Dune / Frank Herbert"
+    terms = ['"' + word.replace('"', '""') + '"*' for word in q.split()]
+    return ' '.join(terms)
+
+@library.route('/library/search', methods=['GET'])
+def search_books():
+    try:
+        q = request.args.get('q', '').strip()
+        if not q:
+            return jsonify({'error': 'q is required'}), 400
+        limit = parse_limit(request.args) or current_app.config['SEARCH_PAGE_SIZE']
+
+        stmt = select_books()
+        params = {}
+        if db.engine.dialect.name == 'sqlite':
+            stmt = stmt.join(books_fts, books_fts.c.rowid == Book.book_id).where(
+                text('books_fts MATCH :q')).order_by(books_fts.c.rank)
+            params['q'] = fts_query(q)
+        else:
+            # no fts table here: every word has to appear in the title or author
+            author_name = Author.first_name + ' ' + Author.last_name
+            for word in q.split():
+                stmt = stmt.where(db.or_(contains(Book.title, word), contains(author_name, word)))
+            stmt = stmt.order_by(Book.book_id)
+        books = db.session.execute(stmt.limit(limit), params).all()
+
+        book_list = [book_to_dict(book) for book in books]
         return jsonify(book_list), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        app.logger.error(f'Error fetching books: {str(e)}')
+        current_app.logger.error(f'Error searching books: {str(e)}')
+        return jsonify({'error': 'Failed to search books'}), 500
+
+@library.route('/books', methods=['GET'])
+@versioned('books')
+def get_books_by_id():
+    """Multi-get: /books?ids=1,2,3 returns just those books (unknown ids
+    are left out). The full, filterable listing is /library."""
+    try:
+        if 'ids' not in request.args:
+            return jsonify({'error': 'ids is required'}), 400
+        stmt = select_books().where(Book.book_id.in_(parse_ids(request.args))).order_by(Book.book_id)
+        books = db.session.execute(stmt).all()
+        return jsonify([book_to_dict(book) for book in books]), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f'Error fetching books: {str(e)}')
         return jsonify({'error': 'Failed to fetch books'}), 500
 
-@app.route('/customers', methods=['POST'])
+@library.route('/books/<int:book_id>', methods=['GET'])
+@versioned('books')
+def get_book(book_id):
+    try:
+        book = db.session.execute(select_books().where(Book.book_id == book_id)).first()
+        if book is None:
+            return jsonify({'error': 'Book not found'}), 404
+        return jsonify(book_to_dict(book)), 200
+    except Exception as e:
+        current_app.logger.error(f'Error fetching book: {str(e)}')
+        return jsonify({'error': 'Failed to fetch book'}), 500
+
+CUSTOMER_FIELDS = ('first_name', 'last_name', 'email')
+
+def parse_customer(data):
+    if not isinstance(data, dict):
+        raise ValueError('expected an object with the customer fields')
+    missing = [f for f in CUSTOMER_FIELDS if not isinstance(data.get(f), str) or not data[f].strip()]
+    if missing:
+        raise ValueError('missing ' + ', '.join(missing))
+    return {f: data[f] for f in CUSTOMER_FIELDS}
+
+def customer_integrity_error(e):
+    # only the unique email index is a conflict; sqlite and postgres both
+    # name the index in their message
+    db.session.rollback()
+    if 'uq_customers_email' in str(e.orig):
+        return jsonify({'error': 'A customer with this email already exists'}), 409
+    current_app.logger.error(f'Error saving customer: {str(e)}')
+    return jsonify({'error': 'Invalid customer data'}), 400
+
+@library.route('/customers', methods=['POST'])
 def add_customer():
     try:
-        data = request.json
+        params = parse_customer(request.json)
         stmt = text("""
             INSERT INTO customers (first_name, last_name, email)
             VALUES (:first_name, :last_name, :email)
+            RETURNING customer_id
         """)
-        db.session.execute(stmt, {
-            'first_name': data['first_name'],
-            'last_name': data['last_name'],
-            'email': data['email']
-        })
-        db.session.commit()
+        customer_id = db.session.execute(stmt, params).scalar()
+        record_change('customers', customer_id, 'insert')
+        commit_changes('customers')
         return jsonify({'message': 'Customer added successfully'}), 201
+    except sqlalchemy.exc.IntegrityError as e:
+        return customer_integrity_error(e)
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
     
-@app.route('/customers/<int:customer_id>', methods=['PUT'])
+@library.route('/customers/<int:customer_id>', methods=['PUT'])
 def update_customer(customer_id):
     try:
-        data = request.json
+        params = parse_customer(request.json)
         stmt = text("""
             UPDATE customers
             SET first_name = :first_name,
@@ -271,32 +1308,33 @@ def update_customer(customer_id):
                 email = :email
             WHERE customer_id = :customer_id
         """)
-        result = db.session.execute(stmt, {
-            'first_name': data['first_name'],
-            'last_name': data['last_name'],
-            'email': data['email'],
-            'customer_id': customer_id
-        })
-        db.session.commit()
-
+        result = db.session.execute(stmt, dict(params, customer_id=customer_id))
         if result.rowcount == 0:
+            db.session.rollback()
             return jsonify({'error': 'Customer not found'}), 404
 
+        record_change('customers', customer_id, 'update')
+        commit_changes('customers')
+
         return jsonify({'message': 'Customer updated successfully'}), 200
+    except sqlalchemy.exc.IntegrityError as e:
+        return customer_integrity_error(e)
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
     
-@app.route('/customers/<int:customer_id>', methods=['DELETE'])
+@library.route('/customers/<int:customer_id>', methods=['DELETE'])
 def delete_customer(customer_id):
     try:
         stmt = text("DELETE FROM customers WHERE customer_id = :customer_id")
         result = db.session.execute(stmt, {'customer_id': customer_id})
-        db.session.commit()
-
         if result.rowcount == 0:
+            db.session.rollback()
             return jsonify({'error': 'Customer not found'}), 404
 
+        record_change('customers', customer_id, 'delete')
+        commit_changes('customers')
+
         return jsonify({'message': 'Customer deleted successfully'}), 200
     except Exception as e:
         db.session.rollback()
@@ -304,80 +1342,117 @@ def delete_customer(customer_id):
 
 
 
-@app.route('/customers', methods=['GET'])
+@library.route('/customers', methods=['GET'])
+@versioned('customers')
 def get_customers():
+    """Customers by id, keyset paged with ?limit=&after=. ?q= matches the
+    start of the first or last name and ?email= the start of the address,
+    ignoring case. On sqlite that is A-Z only: lower() leaves other letters
+    alone, so q=émile doesn't find Émile (postgres folds all of unicode)."""
     try:
-        customers = Customer.query.all()
-        customer_list = [
-            {
-                'customer_id': customer.customer_id,
-                'first_name': customer.first_name,
-                'last_name': customer.last_name,
-                'email': customer.email
-            }
-            for customer in customers
-        ]
-        return jsonify(customer_list), 200
+        limit = parse_limit(request.args)
+        stmt = select_customers().where(*customer_filters(request.args))
+
+        # keyset paging on customer_id, same cursor format as /library
+        if request.args.get('after'):
+            (after_id,) = decode_cursor(request.args['after'], int)
+            stmt = stmt.where(Customer.customer_id > after_id)
+        stmt = stmt.order_by(Customer.customer_id)
+
+        if stream_requested():
+            if limit is not None:
+                stmt = stmt.limit(limit)
+            return stream_json(stmt, customer_to_dict)
+
+        customers, next_cursor = keyset_page(stmt, limit, lambda customer: (customer.customer_id,))
+        return page_response([customer_to_dict(customer) for customer in customers], next_cursor), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        app.logger.error(f'Error fetching customers: {str(e)}')
+        current_app.logger.error(f'Error fetching customers: {str(e)}')
         return jsonify({'error': 'Failed to fetch customers'}), 500
 
-@app.route('/transactions', methods=['POST'])
-def add_transaction():
+@library.route('/customers/<int:customer_id>', methods=['GET'])
+@versioned('customers')
+def get_customer(customer_id):
     try:
-        data = request.json
+        customer = db.session.execute(
+            select_customers().where(Customer.customer_id == customer_id)).first()
+        if customer is None:
+            return jsonify({'error': 'Customer not found'}), 404
+        return jsonify(customer_to_dict(customer)), 200
+    except Exception as e:
+        current_app.logger.error(f'Error fetching customer: {str(e)}')
+        return jsonify({'error': 'Failed to fetch customer'}), 500
 
-        # check if book exists
-        book_row = db.session.execute(
-            text("SELECT availability FROM books WHERE book_id = :book_id"),
-            {'book_id': data['book_id']}
-        ).mappings().fetchone()
-        if not book_row:
-            return jsonify({'error': 'Book not found'}), 404
-        if not book_row['availability']:
-            return jsonify({'error': 'Book is not available'}), 400
+def due_date_for(borrowed, data):
+    # an explicit due_date wins, otherwise the configured loan period
+    if data.get('due_date'):
+        return parse_date(data['due_date'], 'due_date')
+    return borrowed + datetime.timedelta(days=current_app.config['LOAN_PERIOD_DAYS'])
 
-        # mark book as unavailable
-        db.session.execute(
-            text("UPDATE books SET availability = FALSE WHERE book_id = :book_id"),
-            {'book_id': data['book_id']}
-        )
+@library.route('/transactions', methods=['POST'])
+def add_transaction():
+    try:
+        data = request.json
 
-        # insert the transaction
         borrowed = datetime.datetime.strptime(data['date_borrowed'], '%Y-%m-%d').date()
         returned = None
         if data.get('date_returned'):
             returned = datetime.datetime.strptime(data['date_returned'], '%Y-%m-%d').date()
+        due = due_date_for(borrowed, data)
+
+        # claim the book in one conditional update. the row lock taken by the
+        # UPDATE means only one of several concurrent checkouts can match
+        # "availability = true", so rowcount tells us who won.
+        claimed = db.session.execute(CHECKOUT_BOOK, {
+            'book_id': data['book_id'], 'available': True, 'unavailable': False
+        }).rowcount
+        if not claimed:
+            db.session.rollback()
+            exists = db.session.execute(
+                text("SELECT 1 FROM books WHERE book_id = :book_id"),
+                {'book_id': data['book_id']}
+            ).first()
+            if not exists:
+                return jsonify({'error': 'Book not found'}), 404
+            return jsonify({'error': 'Book is not available'}), 400
 
-        db.session.execute(
+        # insert the transaction
+        transaction_id = db.session.execute(
             text("""
                 INSERT INTO transactions
-                  (book_id, customer_id, date_borrowed, date_returned)
+                  (book_id, customer_id, date_borrowed, date_returned, due_date)
                 VALUES
-                  (:book_id, :customer_id, :date_borrowed, :date_returned)
+                  (:book_id, :customer_id, :date_borrowed, :date_returned, :due_date)
+                RETURNING transaction_id
             """),
             {
                 'book_id': data['book_id'],
                 'customer_id': data['customer_id'],
                 'date_borrowed': borrowed,
-                'date_returned': returned
+                'date_returned': returned,
+                'due_date': due
             }
-        )
+        ).scalar()
 
-        db.session.commit()
+        record_change('transactions', transaction_id, 'insert')
+        record_change('books', data['book_id'], 'update')
+        commit_changes('books', 'transactions')
         return jsonify({'message': 'Transaction added successfully'}), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
 
-@app.route('/transactions/<int:transaction_id>', methods=['PUT'])
+@library.route('/transactions/<int:transaction_id>', methods=['PUT'])
 def update_transaction(transaction_id):
     try:
         data = request.json
 
         # fetch the original transaction so we can compare return‑dates & book‑ids
         orig = db.session.execute(
-            text("SELECT book_id, date_returned FROM transactions WHERE transaction_id = :tid"),
+            text("SELECT book_id, date_borrowed, date_returned, due_date FROM transactions WHERE transaction_id = :tid")
+                .columns(date_borrowed=db.Date, due_date=db.Date),
             {"tid": transaction_id}
         ).mappings().fetchone()
 
@@ -394,6 +1469,10 @@ def update_transaction(transaction_id):
         new_returned   = None
         if data.get('date_returned'):
             new_returned = datetime.datetime.strptime(data['date_returned'], '%Y-%m-%d').date()
+        # keep the due date unless one is given or the loan now starts on another day
+        new_due = orig['due_date']
+        if data.get('due_date') or new_borrowed != orig['date_borrowed'] or new_due is None:
+            new_due = due_date_for(new_borrowed, data)
 
         # update the transactions row
         stmt = text("""
@@ -401,7 +1480,8 @@ def update_transaction(transaction_id):
             SET book_id       = :bid,
                 customer_id   = :cid,
                 date_borrowed = :db,
-                date_returned = :dr
+                date_returned = :dr,
+                due_date      = :due
             WHERE transaction_id = :tid
         """)
         result = db.session.execute(stmt, {
@@ -409,6 +1489,7 @@ def update_transaction(transaction_id):
             "cid": new_customer_id,
             "db":  new_borrowed,
             "dr":  new_returned,
+            "due": new_due,
             "tid": transaction_id
         })
 
@@ -422,14 +1503,14 @@ def update_transaction(transaction_id):
             # went from NOT returned -> returned -> free the book
             if orig_returned is None and new_returned is not None:
                 db.session.execute(
-                    text("UPDATE books SET availability = TRUE WHERE book_id = :bid"),
-                    {"bid": new_book_id}
+                    SET_AVAILABILITY,
+                    {'available': True, 'book_id': new_book_id}
                 )
             # went from returned -> no return date -> mark it out again
             elif orig_returned is not None and new_returned is None:
                 db.session.execute(
-                    text("UPDATE books SET availability = FALSE WHERE book_id = :bid"),
-                    {"bid": new_book_id}
+                    SET_AVAILABILITY,
+                    {'available': False, 'book_id': new_book_id}
                 )
 
         # if they changed which book the transaction is for
@@ -439,23 +1520,26 @@ def update_transaction(transaction_id):
             # free the old if it was still out
             if orig_returned is None:
                 db.session.execute(
-                    text("UPDATE books SET availability = TRUE WHERE book_id = :bid"),
-                    {"bid": orig_book_id}
+                    SET_AVAILABILITY,
+                    {'available': True, 'book_id': orig_book_id}
                 )
             # borrow the new if they're not returning it immediately
             if new_returned is None:
                 db.session.execute(
-                    text("UPDATE books SET availability = FALSE WHERE book_id = :bid"),
-                    {"bid": new_book_id}
+                    SET_AVAILABILITY,
+                    {'available': False, 'book_id': new_book_id}
                 )
             else:
                 # if they set a return date on the new book, keep it available
                 db.session.execute(
-                    text("UPDATE books SET availability = TRUE WHERE book_id = :bid"),
-                    {"bid": new_book_id}
+                    SET_AVAILABILITY,
+                    {'available': True, 'book_id': new_book_id}
                 )
 
-        db.session.commit()
+        record_change('transactions', transaction_id, 'update')
+        for book_id in {orig_book_id, new_book_id}:
+            record_change('books', book_id, 'update')
+        commit_changes('books', 'transactions')
         return jsonify({"message": "Transaction updated successfully"}), 200
 
     except Exception as e:
@@ -463,7 +1547,7 @@ def update_transaction(transaction_id):
         return jsonify({"error": str(e)}), 400
 
 
-@app.route('/transactions/<int:transaction_id>', methods=['DELETE'])
+@library.route('/transactions/<int:transaction_id>', methods=['DELETE'])
 def delete_transaction(transaction_id):
     try:
         # fetch existing transaction
@@ -477,8 +1561,8 @@ def delete_transaction(transaction_id):
         # if it wasn’t returned, free the book
         if tx['date_returned'] is None:
             db.session.execute(
-                text("UPDATE books SET availability = TRUE WHERE book_id = :book_id"),
-                {'book_id': tx['book_id']}
+                SET_AVAILABILITY,
+                {'available': True, 'book_id': tx['book_id']}
             )
 
         # delete the row
@@ -487,7 +1571,10 @@ def delete_transaction(transaction_id):
             {'id': transaction_id}
         )
 
-        db.session.commit()
+        record_change('transactions', transaction_id, 'delete')
+        if tx['date_returned'] is None:
+            record_change('books', tx['book_id'], 'update')
+        commit_changes('books', 'transactions')
         return jsonify({'message': 'Transaction deleted successfully'}), 200
 
     except Exception as e:
@@ -495,57 +1582,806 @@ def delete_transaction(transaction_id):
         return jsonify({'error': str(e)}), 400
 
 
-@app.route('/transactions', methods=['GET'])
+@library.route('/transactions', methods=['GET'])
+@versioned('transactions', 'books', 'customers')
 def get_transactions():
     try:
-        transactions = db.session.query(Transaction, Book, Customer).join(Book, 
-            Transaction.book_id == Book.book_id).join(Customer, 
-            Transaction.customer_id == Customer.customer_id).all()
+        stmt = select_transactions().where(*transaction_filters(request.args))
 
-        transaction_list = [
-            {
-                'transaction_id': transaction.Transaction.transaction_id,
-                'book_id': transaction.Transaction.book_id,
-                'book_title': transaction.Book.title,
-                'customer_name': f'{transaction.Customer.first_name} {transaction.Customer.last_name}',
-                'customer_id': transaction.Transaction.customer_id,
-                'date_borrowed': transaction.Transaction.date_borrowed.strftime('%Y-%m-%d'),
-                'date_returned': transaction.Transaction.date_returned.strftime('%Y-%m-%d') if transaction.Transaction.date_returned else None
-            }
-            for transaction in transactions
-        ]
+        if stream_requested():
+            return stream_json(stmt.order_by(Transaction.transaction_id), transaction_to_dict)
+
+        transactions = db.session.execute(stmt).all()
+        transaction_list = [transaction_to_dict(transaction) for transaction in transactions]
         return jsonify(transaction_list), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        app.logger.error(f'Error fetching transactions: {str(e)}')
+        current_app.logger.error(f'Error fetching transactions: {str(e)}')
         return jsonify({'error': 'Failed to fetch transactions'}), 500
 
-@app.route('/transactions/return', methods=['POST'])
+@library.route('/transactions/<int:transaction_id>', methods=['GET'])
+@versioned('transactions', 'books', 'customers')
+def get_transaction(transaction_id):
+    try:
+        transaction = db.session.execute(
+            select_transactions().where(Transaction.transaction_id == transaction_id)).first()
+        if transaction is None:
+            return jsonify({'error': 'Transaction not found'}), 404
+        return jsonify(transaction_to_dict(transaction)), 200
+    except Exception as e:
+        current_app.logger.error(f'Error fetching transaction: {str(e)}')
+        return jsonify({'error': 'Failed to fetch transaction'}), 500
+
+@library.route('/transactions/return', methods=['POST'])
 def return_book():
-    data = request.json
-    transaction = Transaction.query.get(data['transaction_id'])
-    if not transaction:
-        return jsonify({'error': 'Transaction not found'}), 404
-    if transaction.date_returned:
-        return jsonify({'error': 'Book already returned'}), 400
-    transaction.date_returned = datetime.date.today()
-    book = Book.query.get(transaction.book_id)
-    book.availability = True
+    try:
+        transaction_id = (request.get_json(silent=True) or {}).get('transaction_id')
+        if not isinstance(transaction_id, int) or isinstance(transaction_id, bool):
+            raise ValueError('transaction_id must be an integer id')
+
+        # the IS NULL guard makes a concurrent return of the same loan a no‑op
+        book_id = db.session.execute(
+            text("""
+                UPDATE transactions
+                   SET date_returned = :today
+                 WHERE transaction_id = :transaction_id
+                   AND date_returned IS NULL
+                RETURNING book_id
+            """),
+            {'transaction_id': transaction_id, 'today': datetime.date.today()}
+        ).scalar()
+        if book_id is None:
+            db.session.rollback()
+            exists = db.session.execute(
+                text("SELECT 1 FROM transactions WHERE transaction_id = :transaction_id"),
+                {'transaction_id': transaction_id}
+            ).first()
+            if not exists:
+                return jsonify({'error': 'Transaction not found'}), 404
+            return jsonify({'error': 'Book already returned'}), 400
+
+        db.session.execute(SET_AVAILABILITY, {'book_id': book_id, 'available': True})
+        db.session.flush()
+        record_change('transactions', transaction_id, 'update')
+        record_change('books', book_id, 'update')
+        commit_changes('books', 'transactions')
+        return jsonify({'message': 'Book returned successfully'}), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Error returning book: {str(e)}')
+        return jsonify({'error': 'Failed to return book'}), 500
+
+def loan_history(column, owner_id):
+    """Loans where `column` = owner_id, newest first, keyset paged with
+    ?limit=&after= on (date_borrowed, transaction_id)."""
+    limit = parse_limit(request.args)
+    stmt = select_transactions().where(column == owner_id)
+    if request.args.get('after'):
+        borrowed, after_id = decode_cursor(request.args['after'], str, int)
+        stmt = stmt.where(tuple_(Transaction.date_borrowed, Transaction.transaction_id) <
+                          (parse_date(borrowed, 'cursor'), after_id))
+    stmt = stmt.order_by(Transaction.date_borrowed.desc(), Transaction.transaction_id.desc())
+    loans, next_cursor = keyset_page(
+        stmt, limit, lambda loan: (loan.date_borrowed.isoformat(), loan.transaction_id))
+    return page_response([transaction_to_dict(loan) for loan in loans], next_cursor), 200
+
+@library.route('/customers/<int:customer_id>/transactions', methods=['GET'])
+@versioned('transactions', 'books', 'customers')
+def get_customer_transactions(customer_id):
+    try:
+        if db.session.get(Customer, customer_id) is None:
+            return jsonify({'error': 'Customer not found'}), 404
+        return loan_history(Transaction.customer_id, customer_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f'Error fetching customer transactions: {str(e)}')
+        return jsonify({'error': 'Failed to fetch transactions'}), 500
+
+@library.route('/books/<int:book_id>/transactions', methods=['GET'])
+@versioned('transactions', 'books', 'customers')
+def get_book_transactions(book_id):
+    try:
+        if db.session.get(Book, book_id) is None:
+            return jsonify({'error': 'Book not found'}), 404
+        return loan_history(Transaction.book_id, book_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f'Error fetching book transactions: {str(e)}')
+        return jsonify({'error': 'Failed to fetch transactions'}), 500
+
+OVERDUE_FIELDS = ('transaction_id', 'book_id', 'book_title', 'customer_id', 'customer_name',
+                  'date_borrowed', 'due_date', 'days_overdue')
+
+@library.route('/transactions/overdue', methods=['GET'])
+def get_overdue_transactions():
+    """Open loans past their due date as of ?as_of= (default today), most
+    overdue first. Pages with ?limit=&after= like /library; ?format=csv (or
+    Accept: text/csv) streams the whole report as CSV instead."""
+    try:
+        as_of = datetime.date.today()
+        if request.args.get('as_of'):
+            as_of = parse_date(request.args['as_of'], 'as_of')
+        limit = parse_limit(request.args)
+
+        # the literal "date_returned IS NULL" lets the partial
+        # idx_transactions_overdue answer this in due order
+        stmt = select_transactions().where(
+            Transaction.date_returned.is_(None), Transaction.due_date < as_of)
+        if request.args.get('after'):
+            due, after_id = decode_cursor(request.args['after'], str, int)
+            stmt = stmt.where(tuple_(Transaction.due_date, Transaction.transaction_id) >
+                              (parse_date(due, 'cursor'), after_id))
+        stmt = stmt.order_by(Transaction.due_date, Transaction.transaction_id)
+
+        def serialize(row):
+            loan = transaction_to_dict(row)
+            loan['days_overdue'] = (as_of - row.due_date).days
+            return loan
+
+        if csv_requested():
+            if limit is not None:
+                stmt = stmt.limit(limit)
+            return stream_csv(stmt, OVERDUE_FIELDS, serialize, f'overdue-{as_of}.csv')
+
+        loans, next_cursor = keyset_page(
+            stmt, limit, lambda loan: (loan.due_date.isoformat(), loan.transaction_id))
+        return page_response([serialize(loan) for loan in loans], next_cursor), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f'Error fetching overdue loans: {str(e)}')
+        return jsonify({'error': 'Failed to fetch overdue loans'}), 500
+
+
+def batch_ids(data, field):
+    ids = data.get(field)
+    if not isinstance(ids, list) or not ids:
+        raise ValueError(f'{field} must be a non-empty list of ids')
+    if len(ids) > current_app.config['MAX_BATCH_SIZE']:
+        raise ValueError(f"at most {current_app.config['MAX_BATCH_SIZE']} {field} per request")
+    if not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        raise ValueError(f'{field} must contain integer ids')
+    return ids
+
+def batch_results(ids, key, outcome):
+    # one status per requested id, in request order; repeats are rejected
+    results, seen = [], set()
+    for item_id in ids:
+        if item_id in seen:
+            results.append({key: item_id, 'status': 400, 'error': 'Duplicate id in request'})
+        else:
+            seen.add(item_id)
+            results.append(dict({key: item_id}, **outcome[item_id]))
+    return results
+
+@library.route('/transactions/batch', methods=['POST'])
+def add_transactions_batch():
+    """Check out several books to one customer in a single transaction.
+    Body: {"customer_id", "book_ids": [...], "date_borrowed" (default today),
+    "due_date" (default date_borrowed + LOAN_PERIOD_DAYS)}."""
+    try:
+        data = request.json
+        book_ids = batch_ids(data, 'book_ids')
+        customer_id = data.get('customer_id')
+        if not isinstance(customer_id, int) or isinstance(customer_id, bool):
+            raise ValueError('customer_id must be an integer id')
+        # checked before any book is claimed
+        exists = db.session.execute(
+            text("SELECT 1 FROM customers WHERE customer_id = :customer_id"),
+            {'customer_id': customer_id}
+        ).first()
+        if not exists:
+            return jsonify({'error': 'Customer not found'}), 404
+        borrowed = datetime.date.today()
+        if data.get('date_borrowed'):
+            borrowed = datetime.datetime.strptime(data['date_borrowed'], '%Y-%m-%d').date()
+        due = due_date_for(borrowed, data)
+        wanted = list(dict.fromkeys(book_ids))
+
+        # claim every available book at once, same rule as add_transaction
+        claimed = db.session.execute(
+            text("""
+                UPDATE books
+                   SET availability = :unavailable
+                 WHERE book_id IN :ids
+                   AND availability = :available
+                RETURNING book_id
+            """).bindparams(bindparam('ids', expanding=True)),
+            {'ids': wanted, 'available': True, 'unavailable': False}
+        ).scalars().all()
+
+        outcome = {}
+        claimed_set = set(claimed)
+        unclaimed = [b for b in wanted if b not in claimed_set]
+        if unclaimed:
+            existing = set(db.session.execute(
+                text("SELECT book_id FROM books WHERE book_id IN :ids").bindparams(
+                    bindparam('ids', expanding=True)),
+                {'ids': unclaimed}
+            ).scalars())
+            for book_id in unclaimed:
+                if book_id in existing:
+                    outcome[book_id] = {'status': 400, 'error': 'Book is not available'}
+                else:
+                    outcome[book_id] = {'status': 404, 'error': 'Book not found'}
+
+        if claimed:
+            inserted = db.session.execute(
+                insert(Transaction).returning(Transaction.transaction_id, Transaction.book_id),
+                [
+                    {'book_id': book_id, 'customer_id': customer_id,
+                     'date_borrowed': borrowed, 'date_returned': None, 'due_date': due}
+                    for book_id in claimed
+                ]
+            ).all()
+            for transaction_id, book_id in inserted:
+                outcome[book_id] = {'status': 201, 'transaction_id': transaction_id}
+                record_change('transactions', transaction_id, 'insert')
+                record_change('books', book_id, 'update')
+            commit_changes('books', 'transactions')
+        else:
+            db.session.rollback()
+
+        return jsonify({'results': batch_results(book_ids, 'book_id', outcome)}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+
+@library.route('/transactions/return/batch', methods=['POST'])
+def return_books_batch():
+    """Return several loans in a single transaction. Body: {"transaction_ids": [...]}."""
+    try:
+        transaction_ids = batch_ids(request.json, 'transaction_ids')
+        wanted = list(dict.fromkeys(transaction_ids))
+
+        # the IS NULL guard makes a concurrent return of the same loan a no‑op
+        returned = db.session.execute(
+            text("""
+                UPDATE transactions
+                   SET date_returned = :today
+                 WHERE transaction_id IN :ids
+                   AND date_returned IS NULL
+                RETURNING transaction_id, book_id
+            """).bindparams(bindparam('ids', expanding=True)),
+            {'ids': wanted, 'today': datetime.date.today()}
+        ).all()
+
+        outcome = {}
+        if returned:
+            db.session.execute(
+                text("UPDATE books SET availability = :available WHERE book_id IN :ids").bindparams(
+                    bindparam('ids', expanding=True)),
+                {'ids': list({book_id for _, book_id in returned}), 'available': True}
+            )
+            for transaction_id, book_id in returned:
+                outcome[transaction_id] = {'status': 200, 'book_id': book_id}
+                record_change('transactions', transaction_id, 'update')
+                record_change('books', book_id, 'update')
+
+        rest = [t for t in wanted if t not in outcome]
+        if rest:
+            existing = set(db.session.execute(
+                text("SELECT transaction_id FROM transactions WHERE transaction_id IN :ids").bindparams(
+                    bindparam('ids', expanding=True)),
+                {'ids': rest}
+            ).scalars())
+            for transaction_id in rest:
+                if transaction_id in existing:
+                    outcome[transaction_id] = {'status': 400, 'error': 'Book already returned'}
+                else:
+                    outcome[transaction_id] = {'status': 404, 'error': 'Transaction not found'}
+
+        if returned:
+            commit_changes('books', 'transactions')
+        else:
+            db.session.rollback()
+        return jsonify({'results': batch_results(transaction_ids, 'transaction_id', outcome)}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+
+CHANGE_FEEDS = {
+    # table -> (select for current rows, primary key column, serializer)
+    'books': (select_books, Book.book_id, book_to_dict),
+    'customers': (select_customers, Customer.customer_id, customer_to_dict),
+    'transactions': (select_transactions, Transaction.transaction_id, transaction_to_dict),
+}
+
+@library.route('/changes', methods=['GET'])
+def get_changes():
+    """Rows changed since the client's watermark. Each table lists the
+    inserted, updated and deleted ids (one entry per row, by its latest
+    change) and 'rows' holds the current payload of every row still there.
+    Pass the returned 'next' as ?since= on the following call; when
+    'has_more' is true there are more changes waiting. Seq numbers commit
+    in order (see lock_change_log()), so nothing is skipped behind 'next'."""
+    try:
+        try:
+            since = int(request.args.get('since', 0))
+        except ValueError:
+            raise ValueError('since must be an integer')
+        limit = parse_limit(request.args) or current_app.config['MAX_PAGE_SIZE']
+
+        entries = Change.query.filter(Change.seq > since).order_by(Change.seq).limit(limit + 1).all()
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+
+        # collapse to the latest op per row; something inserted and then
+        # updated inside the window is still new to the client
+        latest = {}
+        for entry in entries:
+            key = (entry.table_name, entry.row_id)
+            op = entry.op
+            if op == 'update' and latest.get(key) == 'insert':
+                op = 'insert'
+            latest[key] = op
+
+        result = {}
+        for table_name, (base_select, pk, serialize) in CHANGE_FEEDS.items():
+            ops = {row_id: op for (name, row_id), op in latest.items() if name == table_name}
+            live = [row_id for row_id, op in ops.items() if op != 'delete']
+            rows = []
+            for chunk in chunks(sorted(live), current_app.config['BULK_LOOKUP_CHUNK']):
+                rows.extend(serialize(row) for row in db.session.execute(
+                    base_select().where(pk.in_(chunk)).order_by(pk)))
+            result[table_name] = {
+                'inserted': sorted(i for i, op in ops.items() if op == 'insert'),
+                'updated' : sorted(i for i, op in ops.items() if op == 'update'),
+                'deleted' : sorted(i for i, op in ops.items() if op == 'delete'),
+                'rows'    : rows
+            }
+
+        result['next'] = entries[-1].seq if entries else since
+        result['has_more'] = has_more
+        return jsonify(result), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f'Error fetching changes: {str(e)}')
+        return jsonify({'error': 'Failed to fetch changes'}), 500
+
+@library.route('/events', methods=['GET'])
+def stream_events():
+    """Server‑Sent Events for committed changes. Event names are table names
+    ('books', 'customers', 'transactions'), the data is {"id", "op"} and the
+    event id is the change's seq; fetch /changes to pick up the rows
+    themselves.
+
+    This stream is fed by the in‑process bus, so it only carries writes made
+    by the same process and holds a request thread for as long as it is
+    open. That suits the development server; with several workers, serve
+    /events through asgi.py. At most EVENT_MAX_SUBSCRIBERS streams are
+    accepted per process."""
+    subscription = event_bus.subscribe(limit=current_app.config['EVENT_MAX_SUBSCRIBERS'])
+    if subscription is None:
+        return jsonify({'error': 'Too many event subscribers; serve /events through asgi.py'}), 503
+    keepalive = current_app.config['EVENT_KEEPALIVE']
+    # the generator runs after the view has returned, outside the app context
+    dumps = current_app.json.dumps
+
+    def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            while not subscription.closed:
+                try:
+                    seq, name, data = subscription.get(timeout=keepalive)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                yield f'id: {seq}\nevent: {name}\ndata: {dumps(data)}\n\n'
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'     # don't let a proxy buffer the stream
+    })
+
+@library.route('/stats', methods=['GET'])
+def get_stats():
+    """Dashboard numbers computed in the database. Takes the same filter
+    parameters as /library (for the book figures) and /transactions (for
+    the loan figures)."""
+    try:
+        book_criteria = book_filters(request.args)
+        book_totals = db.session.query(
+            func.count(Book.book_id),
+            func.avg(Book.price),
+            func.sum(case((Book.availability.is_(False), 1), else_=0))
+        ).join(Author, Book.author_id == Author.author_id).join(Genre,
+            Book.genre_id == Genre.genre_id).filter(*book_criteria).one()
+
+        genre_name = func.lower(Genre.name)
+        by_genre = db.session.query(genre_name, func.count(Book.book_id)).join(Book,
+            Book.genre_id == Genre.genre_id).join(Author,
+            Book.author_id == Author.author_id).filter(*book_criteria).group_by(
+            genre_name).all()
+
+        # count(date_returned) skips NULLs, i.e. counts only returned loans
+        loan_totals = db.session.query(
+            func.count(Transaction.transaction_id),
+            func.count(Transaction.date_returned)
+        ).filter(*transaction_filters(request.args)).one()
+
+        book_count, avg_price, checked_out = book_totals
+        loan_count, returned = loan_totals
+        return jsonify({
+            'books': {
+                'count': book_count,
+                # float() because postgres hands back AVG as a Decimal
+                'avg_price': float(avg_price or 0),
+                'checked_out': checked_out or 0,
+                'by_genre': {name: count for name, count in by_genre}
+            },
+            'transactions': {
+                'count': loan_count,
+                'returned': returned,
+                'outstanding': loan_count - returned
+            }
+        }), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f'Error computing stats: {str(e)}')
+        return jsonify({'error': 'Failed to compute stats'}), 500
+
+# --- schema migrations -------------------------------------------------
+#
+# Each migration is (version, description, function) and runs once, in
+# order; applied versions are recorded in schema_version. Steps must be
+# safe to re‑run (IF NOT EXISTS, column checks, ...) because a database set
+# up by an older release may already have some of the objects.
+
+def create_index(name, table_name, columns, where=None, unique=False):
+    """CREATE INDEX IF NOT EXISTS without blocking writers where the backend
+    allows it. Postgres builds it CONCURRENTLY, which can't run inside a
+    transaction, so it goes through its own autocommit connection."""
+    concurrently = 'CONCURRENTLY ' if db.engine.dialect.name == 'postgresql' else ''
+    kind = 'UNIQUE INDEX' if unique else 'INDEX'
+    sql = f'CREATE {kind} {concurrently}IF NOT EXISTS {name} ON {table_name} ({columns})'
+    if where:
+        sql += f' WHERE {where}'
+    if concurrently:
+        db.session.commit()
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.execute(text(sql))
+    else:
+        db.session.execute(text(sql))
+        db.session.commit()
+
+def drop_index(name):
+    concurrently = 'CONCURRENTLY ' if db.engine.dialect.name == 'postgresql' else ''
+    if concurrently:
+        db.session.commit()
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.execute(text(f'DROP INDEX {concurrently}IF EXISTS {name}'))
+    else:
+        db.session.execute(text(f'DROP INDEX IF EXISTS {name}'))
+        db.session.commit()
+
+def run_in_batches(statement, table_name, key):
+    """Run `statement` over ascending ranges of `key`, binding each range as
+    :lo/:hi and committing after every batch. Locks stay short and a big
+    backfill can be interrupted and simply re‑run."""
+    size = current_app.config['MIGRATION_BATCH_SIZE']
+    low, high = db.session.execute(text(f'SELECT MIN({key}), MAX({key}) FROM {table_name}')).one()
+    if low is None:
+        return
+    for start in range(low, high + 1, size):
+        db.session.execute(statement, {'lo': start, 'hi': start + size - 1})
+        db.session.commit()
+
+# Migrations that create tables spell out the DDL as it stood when they
+# were written rather than calling create_all() on the current models, so
+# a database stopped at version N has the version N schema whatever the
+# models look like today. These fill in the types that differ by backend.
+DDL_TYPES = {
+    'sqlite'    : {'id': 'INTEGER NOT NULL', 'seq': 'INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT',
+                   'timestamp': 'DATETIME'},
+    'postgresql': {'id': 'SERIAL NOT NULL', 'seq': 'SERIAL PRIMARY KEY',
+                   'timestamp': 'TIMESTAMP WITHOUT TIME ZONE'},
+}
+
+def create_tables(*statements):
+    types = DDL_TYPES.get(db.engine.dialect.name, DDL_TYPES['postgresql'])
+    for statement in statements:
+        db.session.execute(text(statement.format(**types)))
     db.session.commit()
-    return jsonify({'message': 'Book returned successfully'}), 200
 
+def migrate_base_tables():
+    # the schema the app shipped with, before any migration existed
+    create_tables("""
+        CREATE TABLE IF NOT EXISTS authors (
+            author_id  {id},
+            first_name VARCHAR(100) NOT NULL,
+            last_name  VARCHAR(100) NOT NULL,
+            PRIMARY KEY (author_id)
+        )
+    """, 'CREATE INDEX IF NOT EXISTS ix_authors_first_name ON authors (first_name)',
+        'CREATE INDEX IF NOT EXISTS ix_authors_last_name ON authors (last_name)',
+        'CREATE INDEX IF NOT EXISTS idx_authors_name ON authors (first_name, last_name)',
+    """
+        CREATE TABLE IF NOT EXISTS genres (
+            genre_id {id},
+            name     VARCHAR(100) NOT NULL,
+            PRIMARY KEY (genre_id)
+        )
+    """, """
+        CREATE TABLE IF NOT EXISTS books (
+            book_id        {id},
+            title          VARCHAR(200) NOT NULL,
+            author_id      INTEGER NOT NULL,
+            genre_id       INTEGER NOT NULL,
+            published_date DATE NOT NULL,
+            price          FLOAT NOT NULL,
+            availability   BOOLEAN,
+            PRIMARY KEY (book_id),
+            FOREIGN KEY (author_id) REFERENCES authors (author_id),
+            FOREIGN KEY (genre_id) REFERENCES genres (genre_id)
+        )
+    """, """
+        CREATE TABLE IF NOT EXISTS customers (
+            customer_id {id},
+            first_name  VARCHAR(100) NOT NULL,
+            last_name   VARCHAR(100) NOT NULL,
+            email       VARCHAR(200) NOT NULL,
+            PRIMARY KEY (customer_id)
+        )
+    """, """
+        CREATE TABLE IF NOT EXISTS transactions (
+            transaction_id {id},
+            book_id        INTEGER NOT NULL,
+            customer_id    INTEGER NOT NULL,
+            date_borrowed  DATE NOT NULL,
+            date_returned  DATE,
+            PRIMARY KEY (transaction_id),
+            FOREIGN KEY (book_id) REFERENCES books (book_id),
+            FOREIGN KEY (customer_id) REFERENCES customers (customer_id)
+        )
+    """, 'CREATE INDEX IF NOT EXISTS ix_transactions_book_id ON transactions (book_id)',
+        'CREATE INDEX IF NOT EXISTS ix_transactions_customer_id ON transactions (customer_id)')
+
+def migrate_indexes():
+    create_index('ix_authors_first_name', 'authors', 'first_name')
+    create_index('ix_authors_last_name', 'authors', 'last_name')
+    create_index('idx_authors_name', 'authors', 'first_name, last_name')
+    create_index('ix_transactions_book_id', 'transactions', 'book_id')
+    create_index('ix_transactions_customer_id', 'transactions', 'customer_id')
+    create_index('idx_books_genre_availability', 'books', 'genre_id, availability')
+    create_index('idx_transactions_open_loans', 'transactions',
+                 'date_borrowed, book_id, customer_id', where='date_returned IS NULL')
+    create_index('idx_transactions_date_borrowed', 'transactions', 'date_borrowed')
+
+def migrate_drop_duplicate_indexes():
+    # hand‑made copies of ix_transactions_book_id / ix_transactions_customer_id
+    drop_index('idx_transactions_book_id')
+    drop_index('idx_transactions_customer_id')
+
+def migrate_sync_tables():
+    create_tables("""
+        CREATE TABLE IF NOT EXISTS table_versions (
+            table_name  VARCHAR(50) NOT NULL,
+            version     INTEGER NOT NULL,
+            modified_at {timestamp} NOT NULL,
+            PRIMARY KEY (table_name)
+        )
+    """, """
+        CREATE TABLE IF NOT EXISTS changes (
+            seq        {seq},
+            table_name VARCHAR(50) NOT NULL,
+            row_id     INTEGER NOT NULL,
+            op         VARCHAR(10) NOT NULL,
+            changed_at {timestamp} NOT NULL
+        )
+    """)
+    init_table_versions()
+
+def migrate_customer_indexes():
+    # the unique index would fail half way on existing duplicates; stop with
+    # something an operator can act on (merging customers means deciding
+    # whose loans are whose, so it isn't done automatically)
+    duplicates = db.session.execute(text("""
+        SELECT lower(email) FROM customers
+        GROUP BY lower(email) HAVING COUNT(*) > 1 LIMIT 10
+    """)).scalars().all()
+    if duplicates:
+        raise RuntimeError('Cannot make customer emails unique, duplicates exist: '
+                           + ', '.join(duplicates))
+    create_index('uq_customers_email', 'customers', 'lower(email)', unique=True)
+    create_index('idx_customers_first_name', 'customers', 'lower(first_name)')
+    create_index('idx_customers_last_name', 'customers', 'lower(last_name)')
+
+def migrate_unique_names():
+    # fold duplicate authors/genres into the lowest id so the unique indexes
+    # can be built; the books pointing at a duplicate move over first
+    db.session.execute(text("""
+        UPDATE books SET author_id = (
+            SELECT MIN(keep.author_id) FROM authors dup
+              JOIN authors keep ON keep.first_name = dup.first_name AND keep.last_name = dup.last_name
+             WHERE dup.author_id = books.author_id)
+        WHERE author_id IN (
+            SELECT dup.author_id FROM authors dup
+              JOIN authors keep ON keep.first_name = dup.first_name AND keep.last_name = dup.last_name
+             WHERE keep.author_id < dup.author_id)
+    """))
+    db.session.execute(text("""
+        DELETE FROM authors WHERE EXISTS (
+            SELECT 1 FROM authors keep
+             WHERE keep.first_name = authors.first_name AND keep.last_name = authors.last_name
+               AND keep.author_id < authors.author_id)
+    """))
+    db.session.execute(text("""
+        UPDATE books SET genre_id = (
+            SELECT MIN(keep.genre_id) FROM genres dup
+              JOIN genres keep ON keep.name = dup.name
+             WHERE dup.genre_id = books.genre_id)
+        WHERE genre_id IN (
+            SELECT dup.genre_id FROM genres dup
+              JOIN genres keep ON keep.name = dup.name
+             WHERE keep.genre_id < dup.genre_id)
+    """))
+    db.session.execute(text("""
+        DELETE FROM genres WHERE EXISTS (
+            SELECT 1 FROM genres keep
+             WHERE keep.name = genres.name AND keep.genre_id < genres.genre_id)
+    """))
+    db.session.commit()
+    create_index('uq_authors_name', 'authors', 'first_name, last_name', unique=True)
+    create_index('uq_genres_name', 'genres', 'name', unique=True)
+    # same columns as uq_authors_name, now redundant
+    drop_index('idx_authors_name')
+
+def migrate_due_dates():
+    columns = {c['name'] for c in inspect(db.engine).get_columns('transactions')}
+    if 'due_date' not in columns:
+        db.session.execute(text('ALTER TABLE transactions ADD COLUMN due_date DATE'))
+        db.session.commit()
+    # existing loans get the loan period that is configured right now
+    days = int(current_app.config['LOAN_PERIOD_DAYS'])
+    if db.engine.dialect.name == 'sqlite':
+        due = f"date(date_borrowed, '+{days} days')"
+    else:
+        due = f'date_borrowed + {days}'
+    run_in_batches(text(f"""
+        UPDATE transactions SET due_date = {due}
+         WHERE transaction_id BETWEEN :lo AND :hi AND due_date IS NULL
+    """), 'transactions', 'transaction_id')
+    create_index('idx_transactions_overdue', 'transactions', 'due_date, transaction_id',
+                 where='date_returned IS NULL')
+
+def migrate_history_indexes():
+    create_index('idx_transactions_customer_history', 'transactions',
+                 'customer_id, date_borrowed, transaction_id')
+    create_index('idx_transactions_book_history', 'transactions',
+                 'book_id, date_borrowed, transaction_id')
+    # their leading columns cover these now
+    drop_index('ix_transactions_book_id')
+    drop_index('ix_transactions_customer_id')
+
+def migrate_customer_prefix_indexes():
+    if db.engine.dialect.name != 'postgresql':
+        # sqlite's BINARY collation already orders these code point by code point
+        return
+    for name, col in (('idx_customers_first_name', 'first_name'),
+                      ('idx_customers_last_name', 'last_name')):
+        drop_index(name)
+        create_index(name, 'customers', f'lower({col}) text_pattern_ops')
+    create_index('idx_customers_email_prefix', 'customers', 'lower(email) text_pattern_ops')
+
+MIGRATIONS = [
+    (1, 'base tables', migrate_base_tables),
+    (2, 'lookup, open-loan and date indexes', migrate_indexes),
+    (3, 'drop duplicate transaction indexes', migrate_drop_duplicate_indexes),
+    (4, 'full-text search index', create_search_index),
+    (5, 'table versions and change log', migrate_sync_tables),
+    (6, 'unique customer emails and customer name indexes', migrate_customer_indexes),
+    (7, 'unique author and genre names', migrate_unique_names),
+    (8, 'loan due dates and overdue index', migrate_due_dates),
+    (9, 'customer and book loan history indexes', migrate_history_indexes),
+    (10, 'binary-order customer prefix indexes', migrate_customer_prefix_indexes),
+]
+
+MIGRATION_LOCK_ID = 348348
+
+@contextlib.contextmanager
+def migration_lock():
+    """One upgrader at a time across processes, e.g. every worker of
+    `uvicorn --workers N` starting against a new database. Postgres takes
+    a session advisory lock; sqlite has none, and its own write lock can't
+    span steps that commit as they go, so an exclusive lock on a file next
+    to the database stands in for it."""
+    if db.engine.dialect.name == 'postgresql':
+        with db.engine.connect() as conn:
+            conn.execute(text('SELECT pg_advisory_lock(:id)'), {'id': MIGRATION_LOCK_ID})
+            try:
+                yield
+            finally:
+                conn.execute(text('SELECT pg_advisory_unlock(:id)'), {'id': MIGRATION_LOCK_ID})
+        return
+    database = db.engine.url.database
+    if db.engine.dialect.name != 'sqlite' or not database or database == ':memory:':
+        yield
+        return
+    with open(database + '-lock', 'a+b') as lock:
+        lock.seek(0)   # msvcrt locks from the current position
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:   # LK_LOCK gives up after ~10s; keep waiting
+                    pass
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+            else:
+                msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+
+def upgrade_database(target=None, echo=lambda message: None):
+    """Apply pending migrations up to `target` (default: all). Returns the
+    versions applied. Runs under migration_lock(), and reads the applied
+    versions only once it holds it, so a process that waited on another
+    one's upgrade finds nothing left to do."""
+    with migration_lock():
+        SchemaVersion.__table__.create(db.engine, checkfirst=True)
+        applied = {v for (v,) in db.session.query(SchemaVersion.version)}
+        done = []
+        for version, description, step in MIGRATIONS:
+            if version in applied or (target is not None and version > target):
+                continue
+            echo(f'Applying {version}: {description}')
+            step()
+            db.session.add(SchemaVersion(version=version, description=description, applied_at=utcnow()))
+            db.session.commit()
+            done.append(version)
+        return done
+
+@library.cli.command('db-upgrade')
+@click.option('--to', 'target', type=int, default=None, help='Stop after this migration.')
+def db_upgrade_command(target):
+    """Apply pending schema migrations."""
+    done = upgrade_database(target, echo=click.echo)
+    current = db.session.query(func.max(SchemaVersion.version)).scalar()
+    click.echo(f'Database at version {current}' + ('' if done else ' (nothing to do)'))
+
+def create_app(config=None):
+    """Application factory. Every process (dev server, each WSGI worker,
+    the flask CLI) builds its own app and therefore its own engine and pool;
+    `config` overrides the defaults from configure()."""
+    app = Flask(__name__)
+    app.json = LibraryJSONProvider(app)
+    configure(app)
+    if config:
+        app.config.update(config)
+
+    db.init_app(app)
+    library_cache.maxsize = app.config['LIBRARY_CACHE_SIZE']
+    library_cache.ttl = app.config['LIBRARY_CACHE_TTL']
+    library_cache.clear()
+    for cache in (author_ids, genre_ids):
+        cache.maxsize = app.config['NAME_CACHE_SIZE']
+        cache.ttl = app.config['NAME_CACHE_TTL']
+        cache.clear()
+    event_bus.queue_size = app.config['EVENT_QUEUE_SIZE']
+    app.register_blueprint(library)
 
-if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        if db.engine.dialect.name == 'sqlite':
+            event.listen(db.engine, 'connect', sqlite_pragma_listener(app.config['SQLITE_PRAGMAS']))
+        if app.config['AUTO_MIGRATE']:
+            upgrade_database()
+    return app
 
-        db.session.execute(text(
-            "CREATE INDEX IF NOT EXISTS idx_transactions_book_id "
-            "ON transactions(book_id)"
-        ))
-        db.session.execute(text(
-            "CREATE INDEX IF NOT EXISTS idx_transactions_customer_id "
-            "ON transactions(customer_id)"
-        ))
 
-        db.session.commit()
-    app.run(debug=True)
+if __name__ == '__main__':
+    # development server only; see wsgi.py for production
+    create_app().run(debug=True)
@@ -0,0 +1,49 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from server import create_app, db  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    # a real sqlite file (not :memory:) so every thread gets its own
+    # connection and the WAL/busy_timeout pragmas apply as in production
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'library.sqlite3'}",
+    })
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def book_payload(**fields):
+    """An add_book body for Dune; keyword arguments replace its fields."""
+    return dict({
+        'title': 'Dune', 'author_first_name': 'Frank', 'author_last_name': 'Herbert',
+        'genre_name': 'fiction', 'published_date': '1965-08-01', 'price': 9.99,
+        'availability': True}, **fields)
+
+
+def add_books(client, count):
+    for i in range(count):
+        response = client.post('/books', json=book_payload(
+            title=f'Book {i}', genre_name=['fiction', 'romance'][i % 2],
+            published_date='2000-01-01', price=10))
+        assert response.status_code == 201, response.get_json()
+
+
+def add_customers(client, count):
+    for i in range(count):
+        response = client.post('/customers', json={
+            'first_name': f'C{i}', 'last_name': 'X', 'email': f'c{i}@example.com'})
+        assert response.status_code == 201, response.get_json()
@@ -0,0 +1,109 @@
+import asyncio
+import importlib
+import os
+
+import pytest
+
+pytest.importorskip('starlette')
+pytest.importorskip('a2wsgi')
+pytest.importorskip('aiosqlite')
+pytest.importorskip('httpx')
+
+from starlette.testclient import TestClient  # noqa: E402
+
+from conftest import add_books, add_customers  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def asgi(tmp_path_factory):
+    # asgi.py builds its flask app (and engine) at import time from DATABASE_URL
+    path = tmp_path_factory.mktemp('asgi') / 'library.sqlite3'
+    saved = os.environ.get('DATABASE_URL')
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    try:
+        module = importlib.import_module('asgi')
+    finally:
+        if saved is None:
+            del os.environ['DATABASE_URL']
+        else:
+            os.environ['DATABASE_URL'] = saved
+    flask_client = module.flask_app.test_client()
+    add_books(flask_client, 3)
+    add_customers(flask_client, 3)
+    for book_id in (1, 2):
+        flask_client.post('/transactions', json={
+            'book_id': book_id, 'customer_id': 1, 'date_borrowed': '2024-01-01'})
+    return module
+
+
+@pytest.fixture
+def client(asgi):
+    with TestClient(asgi.app) as client:
+        yield client
+
+
+def ids(response, key):
+    assert response.status_code == 200, response.text
+    return [row[key] for row in response.json()]
+
+
+def test_library_multi_get(client):
+    assert ids(client.get('/library?ids=3,1'), 'book_id') == [1, 3]
+    assert client.get('/library?ids=x').status_code == 400
+
+
+def test_other_routes_reach_flask(client):
+    assert client.get('/books/2').json()['title'] == 'Book 1'
+    # a write that changes nothing, as the database is shared by the module
+    response = client.post('/customers', json={
+        'first_name': 'C0', 'last_name': 'X', 'email': 'C0@example.com'})
+    assert response.status_code == 409
+
+
+def test_transactions_multi_get(client):
+    assert ids(client.get('/transactions?ids=2'), 'transaction_id') == [2]
+
+
+def test_customers_filters_and_pages_like_flask(asgi, client):
+    flask_client = asgi.flask_app.test_client()
+    for query in ('limit=1', 'ids=1', 'q=c2', 'email=C1@', 'limit=2&q=c'):
+        wsgi = flask_client.get('/customers?' + query)
+        response = client.get('/customers?' + query)
+        assert response.json() == wsgi.get_json(), query
+        assert response.headers.get('X-Next-Cursor') == wsgi.headers.get('X-Next-Cursor'), query
+
+    pages, cursor = [], ''
+    while True:
+        response = client.get('/customers?limit=2' + (f'&after={cursor}' if cursor else ''))
+        pages.append(ids(response, 'customer_id'))
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            break
+    assert pages == [[1, 2], [3]]
+    assert client.get('/customers?after=NQ').status_code == 400
+
+
+def test_events_stream_changes_from_the_shared_log(asgi):
+    # drive the endpoint's body directly: the test clients wait for the whole
+    # response, and this one never ends
+    from starlette.requests import Request
+
+    async def read_events():
+        asgi.change_feed.interval = 0.05
+        response = await asgi.stream_events(Request({'type': 'http', 'headers': []}))
+        chunks = response.body_iterator
+        assert await anext(chunks) == 'retry: 3000\n\n'
+        await asyncio.sleep(0.2)   # let the poller take its watermark
+        # a write through the flask app stands in for another worker's write
+        assert asgi.flask_app.test_client().post(
+            '/transactions/return', json={'transaction_id': 2}).status_code == 200
+        received = [await asyncio.wait_for(anext(chunks), 5) for _ in range(2)]
+        await chunks.aclose()
+        return received
+
+    received = asyncio.run(read_events())
+    assert [chunk.split('\n')[1:3] for chunk in received] == [
+        ['event: transactions', 'data: {"id":2,"op":"update"}'],
+        ['event: books', 'data: {"id":2,"op":"update"}'],
+    ]
+    assert asgi.change_feed.subscriber_count() == 0
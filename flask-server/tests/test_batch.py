@@ -0,0 +1,47 @@
+import pytest
+
+from conftest import add_books, add_customers
+
+
+@pytest.fixture
+def catalog(client):
+    add_books(client, 3)
+    add_customers(client, 1)
+
+
+def statuses(response):
+    assert response.status_code == 200, response.get_json()
+    return [(r.get('book_id', r.get('transaction_id')), r['status'])
+            for r in response.get_json()['results']]
+
+
+def test_batch_checkout_reports_each_book(client, catalog):
+    assert client.post('/transactions', json={
+        'book_id': 2, 'customer_id': 1, 'date_borrowed': '2024-01-01'}).status_code == 201
+    response = client.post('/transactions/batch', json={
+        'customer_id': 1, 'book_ids': [1, 2, 99, 1, 3], 'date_borrowed': '2024-01-02'})
+    assert statuses(response) == [(1, 201), (2, 400), (99, 404), (1, 400), (3, 201)]
+    assert [b['availability'] for b in client.get('/library').get_json()] == [False, False, False]
+    loans = client.get('/transactions').get_json()
+    assert [(t['book_id'], t['due_date']) for t in loans[1:]] == [(1, '2024-01-16'), (3, '2024-01-16')]
+
+
+@pytest.mark.parametrize('body, status, error', [
+    ({'book_ids': [1]}, 400, 'customer_id must be an integer id'),
+    ({'book_ids': [1], 'customer_id': '1'}, 400, 'customer_id must be an integer id'),
+    ({'book_ids': [1], 'customer_id': 42}, 404, 'Customer not found'),
+    ({'book_ids': [], 'customer_id': 1}, 400, 'book_ids must be a non-empty list of ids'),
+])
+def test_batch_checkout_rejects_bad_requests_before_claiming(client, catalog, body, status, error):
+    response = client.post('/transactions/batch', json=body)
+    assert (response.status_code, response.get_json()) == (status, {'error': error})
+    assert all(b['availability'] for b in client.get('/library').get_json())
+
+
+def test_batch_return(client, catalog):
+    client.post('/transactions/batch', json={'customer_id': 1, 'book_ids': [1, 2]})
+    response = client.post('/transactions/return/batch', json={'transaction_ids': [1, 1, 7]})
+    assert statuses(response) == [(1, 200), (1, 400), (7, 404)]
+    response = client.post('/transactions/return/batch', json={'transaction_ids': [1, 2]})
+    assert statuses(response) == [(1, 400), (2, 200)]
+    assert all(b['availability'] for b in client.get('/library').get_json())
@@ -0,0 +1,55 @@
+import pytest
+from sqlalchemy.exc import OperationalError
+
+import server
+from conftest import book_payload
+from server import Book, db
+
+
+def book_count(app):
+    with app.app_context():
+        return db.session.query(Book).count()
+
+
+@pytest.mark.parametrize('bad, error', [
+    ({'price': 'nan'}, 'price must be a finite number'),
+    ({'price': 'inf'}, 'price must be a finite number'),
+    ({'price': 'cheap'}, 'price must be a number'),
+    ({'title': 'x' * 201}, 'title must be at most 200 characters'),
+    ({'genre_name': 'g' * 101}, 'genre_name must be at most 100 characters'),
+    ({'author_last_name': 7}, 'author_last_name must be a string'),
+    ({'published_date': '1965-13-01'}, 'published_date must be a YYYY-MM-DD date'),
+    ({'title': ''}, 'missing title'),
+])
+def test_bad_row_is_reported_and_the_rest_imported(app, client, bad, error):
+    response = client.post('/books/bulk', json=[
+        book_payload(), book_payload(**bad), book_payload(title='Emma')])
+    assert response.status_code == 201
+    assert response.get_json() == {'inserted': 2, 'errors': [{'row': 2, 'error': error}]}
+    assert book_count(app) == 2
+
+
+def test_csv_body(app, client):
+    body = ('title,author_first_name,author_last_name,genre_name,published_date,price,availability\n'
+            'Dune,Frank,Herbert,fiction,1965-08-01,9.99,\n'
+            'Emma,Jane,Austen,romance,1815-12-23,5,false\n')
+    response = client.post('/books/bulk', data=body, content_type='text/csv')
+    assert response.get_json() == {'inserted': 2, 'errors': []}
+    assert [b['availability'] for b in client.get('/library').get_json()] == [True, False]
+
+
+def test_nothing_valid_is_a_400(app, client):
+    response = client.post('/books/bulk', json=[book_payload(price=None)])
+    assert response.status_code == 400
+    assert response.get_json()['inserted'] == 0
+    assert client.post('/books/bulk', json={'title': 'Dune'}).status_code == 400
+
+
+def test_database_error_is_not_echoed(app, client, monkeypatch):
+    def fail(pairs):
+        raise OperationalError('INSERT INTO authors ...', {'first_name': 'Frank'}, Exception('disk I/O error'))
+    monkeypatch.setattr(server, 'resolve_authors', fail)
+    response = client.post('/books/bulk', json=[book_payload()])
+    assert response.status_code == 500
+    assert response.get_json() == {'error': 'Failed to import books'}
+    assert book_count(app) == 0
@@ -0,0 +1,40 @@
+from sqlalchemy import event
+
+from conftest import add_books, add_customers
+from server import db
+
+
+def test_changes_pages_through_every_write(client):
+    add_books(client, 3)
+    add_customers(client, 1)
+    client.post('/transactions/batch', json={'customer_id': 1, 'book_ids': [1, 2]})
+
+    seen, since = [], 0
+    while True:
+        page = client.get(f'/changes?since={since}&limit=2').get_json()
+        seen.extend(page['transactions']['inserted'])
+        since = page['next']
+        if not page['has_more']:
+            break
+    assert sorted(seen) == [1, 2]
+
+
+def test_change_log_writers_take_one_advisory_lock_per_transaction(app, client, monkeypatch):
+    # stand in for postgres: sqlite gets a pg_advisory_xact_lock() that
+    # records its calls, and the dialect check is pointed at postgresql
+    add_books(client, 3)
+    add_customers(client, 1)
+    calls = []
+    with app.app_context():
+        engine = db.engine
+        engine.dispose()
+    event.listen(engine, 'connect', lambda conn, record: conn.create_function(
+        'pg_advisory_xact_lock', 1, calls.append))
+    monkeypatch.setattr(engine.dialect, 'name', 'postgresql')
+
+    response = client.post('/transactions/batch', json={'customer_id': 1, 'book_ids': [1, 2, 3]})
+    assert response.status_code == 200, response.get_json()
+    assert len(calls) == 1
+
+    assert client.post('/transactions/return', json={'transaction_id': 1}).status_code == 200
+    assert len(calls) == 2
@@ -0,0 +1,73 @@
+import threading
+from collections import Counter
+
+from sqlalchemy import text
+
+from conftest import add_books, add_customers
+from server import db
+
+# 100 books x 32 threads = 3,200 racing checkout attempts per test
+BOOKS = 100
+THREADS = 32
+
+
+def run_concurrently(app, work):
+    # every thread gets its own client, and the barrier lines them up so the
+    # checkouts really do race each other
+    barrier = threading.Barrier(THREADS)
+    results, lock = [], threading.Lock()
+
+    def worker(n):
+        client = app.test_client()
+        barrier.wait()
+        for status in work(client, n):
+            with lock:
+                results.append(status)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return Counter(results)
+
+
+def open_loans_per_book(app):
+    with app.app_context():
+        return dict(db.session.execute(text(
+            'SELECT book_id, COUNT(*) FROM transactions WHERE date_returned IS NULL GROUP BY book_id'
+        )).all())
+
+
+def test_concurrent_checkouts_lend_each_book_once(app, client):
+    add_books(client, BOOKS)
+    add_customers(client, THREADS)
+
+    def checkout_everything(client, n):
+        for book_id in range(1, BOOKS + 1):
+            response = client.post('/transactions', json={
+                'book_id': book_id, 'customer_id': n + 1, 'date_borrowed': '2024-01-01'})
+            yield response.status_code
+
+    statuses = run_concurrently(app, checkout_everything)
+
+    assert statuses == {201: BOOKS, 400: BOOKS * (THREADS - 1)}
+    assert open_loans_per_book(app) == {book_id: 1 for book_id in range(1, BOOKS + 1)}
+    with app.app_context():
+        assert db.session.execute(text('SELECT COUNT(*) FROM books WHERE availability')).scalar() == 0
+
+
+def test_concurrent_batch_checkouts_lend_each_book_once(app, client):
+    add_books(client, BOOKS)
+    add_customers(client, THREADS)
+
+    def checkout_batch(client, n):
+        response = client.post('/transactions/batch', json={
+            'customer_id': n + 1, 'book_ids': list(range(1, BOOKS + 1))})
+        for result in response.get_json()['results']:
+            yield result['status']
+
+    statuses = run_concurrently(app, checkout_batch)
+
+    assert statuses == {201: BOOKS, 400: BOOKS * (THREADS - 1)}
+    assert open_loans_per_book(app) == {book_id: 1 for book_id in range(1, BOOKS + 1)}
@@ -0,0 +1,54 @@
+import datetime
+
+import pytest
+
+import server
+from conftest import add_books
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # server.utcnow() stamps table_versions.modified_at and is what
+    # @versioned compares Last-Modified against
+    now = [datetime.datetime(2024, 1, 1, 12, 0, 0)]
+    monkeypatch.setattr(server, 'utcnow', lambda: now[0])
+
+    def at(seconds):
+        now[0] = datetime.datetime(2024, 1, 1, 12, 0, 0) + datetime.timedelta(seconds=seconds)
+    return at
+
+
+def test_if_none_match(client):
+    add_books(client, 1)
+    etag = client.get('/library').headers['ETag']
+    assert client.get('/library', headers={'If-None-Match': etag}).status_code == 304
+    add_books(client, 1)
+    assert client.get('/library', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_no_last_modified_while_the_write_second_is_open(client, clock):
+    clock(0.3)
+    add_books(client, 1)
+    clock(0.5)
+    response = client.get('/library')
+    assert response.status_code == 200 and 'Last-Modified' not in response.headers
+
+    clock(1.2)
+    last_modified = client.get('/library').headers['Last-Modified']
+    assert last_modified == 'Mon, 01 Jan 2024 12:00:01 GMT'
+    assert client.get('/library', headers={'If-Modified-Since': last_modified}).status_code == 304
+
+
+def test_write_in_the_same_second_is_not_a_304(client, clock):
+    clock(1.0)
+    add_books(client, 1)
+    clock(1.2)
+    last_modified = client.get('/library').headers['Last-Modified']
+
+    # a write in the second the previous response was served in
+    clock(1.5)
+    add_books(client, 1)
+    clock(1.6)
+    response = client.get('/library', headers={'If-Modified-Since': last_modified})
+    assert response.status_code == 200
+    assert len(response.get_json()) == 2
@@ -0,0 +1,65 @@
+from flask import Flask
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool
+
+from server import configure, create_app, db
+
+
+def pragmas(connection):
+    return {name: connection.execute(text(f'PRAGMA {name}')).scalar()
+            for name in ('journal_mode', 'synchronous', 'busy_timeout', 'cache_size', 'mmap_size', 'temp_store')}
+
+
+def test_sqlite_pragmas_on_every_connection(app):
+    expected = {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 5000,
+                'cache_size': -64000, 'mmap_size': 268435456, 'temp_store': 2}
+    with app.app_context():
+        # two connections checked out at once, so neither is a reused one
+        with db.engine.connect() as first, db.engine.connect() as second:
+            assert pragmas(first) == pragmas(second) == expected
+
+
+def test_sqlite_pragmas_can_be_overridden(tmp_path):
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'library.sqlite3'}",
+        'SQLITE_PRAGMAS': {'journal_mode': 'DELETE', 'busy_timeout': 250},
+    })
+    with app.app_context():
+        with db.engine.connect() as connection:
+            assert pragmas(connection)['journal_mode'] == 'delete'
+            assert pragmas(connection)['busy_timeout'] == 250
+        db.engine.dispose()
+
+
+def test_pool_settings_come_from_the_environment(tmp_path, monkeypatch):
+    for name, value in (('DB_POOL_SIZE', '3'), ('DB_MAX_OVERFLOW', '2'), ('DB_POOL_TIMEOUT', '7'),
+                        ('DB_POOL_PRE_PING', 'false'), ('DB_POOL_RECYCLE', '60')):
+        monkeypatch.setenv(name, value)
+    # no postgres driver here, so read the options configure() derives for a
+    # server url and apply them to a pooled sqlite engine as the stand-in
+    monkeypatch.setenv('DATABASE_URL', 'postgres://library@db.invalid/library')
+    app = Flask(__name__)
+    configure(app)
+    assert app.config['SQLALCHEMY_DATABASE_URI'] == 'postgresql://library@db.invalid/library'
+    options = app.config['SQLALCHEMY_ENGINE_OPTIONS']
+
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'library.sqlite3'}",
+        'SQLALCHEMY_ENGINE_OPTIONS': options,
+    })
+    with app.app_context():
+        pool = db.engine.pool
+        assert isinstance(pool, QueuePool)
+        assert (pool.size(), pool._max_overflow, pool._timeout, pool._pre_ping, pool._recycle) == (
+            3, 2, 7, False, 60)
+        db.engine.dispose()
+
+
+def test_sqlite_keeps_the_default_pool(monkeypatch):
+    monkeypatch.delenv('DATABASE_URL', raising=False)
+    monkeypatch.setenv('DB_POOL_SIZE', '3')
+    app = Flask(__name__)
+    configure(app)
+    assert 'SQLALCHEMY_ENGINE_OPTIONS' not in app.config
@@ -0,0 +1,90 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+import server
+
+CUSTOMER = {'first_name': 'Jane', 'last_name': 'Austen', 'email': 'jane@example.com'}
+
+
+@pytest.fixture
+def jane(client):
+    assert client.post('/customers', json=CUSTOMER).status_code == 201
+    assert client.post('/customers', json=dict(CUSTOMER, email='emma@example.com')).status_code == 201
+
+
+def test_duplicate_email_is_a_conflict(client, jane):
+    response = client.post('/customers', json=dict(CUSTOMER, email='JANE@example.com'))
+    assert response.status_code == 409
+    response = client.put('/customers/2', json=dict(CUSTOMER, email='Jane@Example.com'))
+    assert response.status_code == 409
+
+
+@pytest.mark.parametrize('method, path', [('post', '/customers'), ('put', '/customers/1')])
+@pytest.mark.parametrize('field', ['first_name', 'last_name', 'email'])
+def test_null_field_is_a_bad_request(client, jane, method, path, field):
+    response = getattr(client, method)(path, json=dict(CUSTOMER, **{field: None}))
+    assert (response.status_code, response.get_json()) == (400, {'error': f'missing {field}'})
+
+
+def test_other_integrity_errors_are_not_reported_as_duplicates(client, jane, monkeypatch):
+    def fail(*args):
+        raise IntegrityError('INSERT INTO customers ...', {}, Exception('CHECK constraint failed'))
+    monkeypatch.setattr(server, 'record_change', fail)
+    response = client.post('/customers', json=dict(CUSTOMER, email='new@example.com'))
+    assert (response.status_code, response.get_json()) == (400, {'error': 'Invalid customer data'})
+
+
+@pytest.fixture
+def people(client):
+    for first, last, email in (('Émile', 'Zola', 'emile@example.com'),
+                               ('John', 'Smith', 'john.smith@example.com'),
+                               ('Johnny', 'Cash', 'johnny@example.com'),
+                               ('john', 'Öberg', 'john_o@example.com')):
+        assert client.post('/customers', json={
+            'first_name': first, 'last_name': last, 'email': email}).status_code == 201
+
+
+def names(client, query):
+    response = client.get('/customers?' + query)
+    assert response.status_code == 200, response.get_json()
+    return [c['last_name'] for c in response.get_json()]
+
+
+@pytest.mark.parametrize('query, found', [
+    ('q=É', ['Zola']),
+    ('q=Émi', ['Zola']),
+    ('q=Ö', ['Öberg']),
+    ('q=john Ö', ['Öberg']),
+    ('q=JOHN', ['Smith', 'Cash', 'Öberg']),
+    ('email=john.', ['Smith']),
+    ('email=JOHN.S', ['Smith']),
+    ('email=john_', ['Öberg']),
+    ('email=john%', []),
+])
+def test_prefix_search_with_punctuation_and_non_ascii(client, people, query, found):
+    assert names(client, query) == found
+
+
+def test_sqlite_folds_ascii_case_only(client, people):
+    # lowercase non-ascii is found as typed; the upper case of it isn't,
+    # since sqlite's lower() only folds A-Z (see the README)
+    client.post('/customers', json={'first_name': 'élodie', 'last_name': 'Dupont', 'email': 'élo@example.com'})
+    assert names(client, 'q=élo') == ['Dupont']
+    assert names(client, 'q=ÉLO') == []
+    assert names(client, 'q=émile') == []
+    assert names(client, 'email=ÉLO@') == []
+
+    def add(email):
+        return client.post('/customers', json={'first_name': 'A', 'last_name': 'B', 'email': email}).status_code
+    assert (add('Ö@example.com'), add('ö@example.com'), add('OE@example.com'), add('oe@example.com')) == (
+        201, 201, 201, 409)
+
+
+def test_postgres_prefix_is_an_escaped_like(app, monkeypatch):
+    from sqlalchemy.dialects import postgresql
+    with app.app_context():
+        monkeypatch.setattr(server.db.engine.dialect, 'name', 'postgresql')
+        clause = server.starts_with(server.Customer.email, 'Émile_%.')
+        sql = str(clause.compile(dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True}))
+    # %% is the pyformat escape of a literal %
+    assert sql == "lower(customers.email) LIKE 'émile/_/%%.%%' ESCAPE '/'"
@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+from conftest import add_books, add_customers
+
+
+@pytest.fixture
+def app(app):
+    # don't let a broken stream hang the test on the 15s keepalive wait
+    app.config['EVENT_KEEPALIVE'] = 1
+    return app
+
+
+def read_event(chunks):
+    # skip keepalives until a real event arrives
+    for _ in range(5):
+        chunk = next(chunks)
+        if chunk.startswith(b'id: '):
+            fields = dict(line.split(': ', 1) for line in chunk.decode().strip().split('\n'))
+            return fields['event'], json.loads(fields['data'])
+    raise AssertionError('no event received')
+
+
+def test_subscriber_receives_committed_changes(client):
+    add_books(client, 1)
+    add_customers(client, 1)
+    response = client.get('/events', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    chunks = response.iter_encoded()
+    assert next(chunks) == b'retry: 3000\n\n'
+
+    assert client.post('/transactions', json={
+        'book_id': 1, 'customer_id': 1, 'date_borrowed': '2024-01-01'}).status_code == 201
+    assert client.post('/transactions/return', json={'transaction_id': 1}).status_code == 200
+
+    received = [read_event(chunks) for _ in range(4)]
+    response.close()
+    assert received == [
+        ('transactions', {'id': 1, 'op': 'insert'}),
+        ('books', {'id': 1, 'op': 'update'}),
+        ('transactions', {'id': 1, 'op': 'update'}),
+        ('books', {'id': 1, 'op': 'update'}),
+    ]
+
+
+def test_wsgi_subscribers_are_capped(app, client):
+    app.config['EVENT_MAX_SUBSCRIBERS'] = 1
+    first = client.get('/events', buffered=False)
+    next(first.iter_encoded())
+    response = client.get('/events')
+    assert response.status_code == 503
+    assert 'asgi.py' in response.get_json()['error']
+    first.close()
+
+
+def test_event_ids_are_change_seqs(client):
+    add_books(client, 1)
+    response = client.get('/events', buffered=False)
+    chunks = response.iter_encoded()
+    next(chunks)
+    add_customers(client, 1)
+    chunk = next(chunks)
+    response.close()
+    # the id can be handed to /changes?since= to resync after a disconnect
+    assert chunk.startswith(f"id: {client.get('/changes').get_json()['next']}\n".encode())
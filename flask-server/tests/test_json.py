@@ -0,0 +1,54 @@
+import datetime
+import decimal
+
+import pytest
+
+import server
+from conftest import book_payload
+
+PAYLOAD = {
+    'published': datetime.date(1965, 8, 1),
+    'changed_at': datetime.datetime(2024, 1, 2, 3, 4, 5, 6),
+    'price': decimal.Decimal('9.99'),
+    'title': 'Émile – ö 😀',
+    'ratio': 1.5, 'missing': None, 'tags': [1, True, {}],
+}
+
+EXPECTED = ('{"changed_at":"2024-01-02T03:04:05.000006","missing":null,"price":"9.99",'
+            '"published":"1965-08-01","ratio":1.5,"tags":[1,true,{}],"title":"Émile – ö 😀"}')
+
+
+def encode_both(monkeypatch, encode):
+    """encode() under orjson and then under the stdlib fallback."""
+    pytest.importorskip('orjson')
+    fast = encode()
+    monkeypatch.setattr(server, 'orjson', None)
+    return fast, encode()
+
+
+def test_dumps(app, monkeypatch):
+    assert encode_both(monkeypatch, lambda: app.json.dumps(PAYLOAD)) == (EXPECTED, EXPECTED)
+
+
+@pytest.mark.parametrize('debug', [False, True])
+def test_response(app, monkeypatch, debug):
+    app.debug = debug
+    with app.app_context():
+        fast, stdlib = encode_both(monkeypatch, lambda: app.json.response(PAYLOAD).get_data())
+    assert fast == stdlib
+    assert 'Émile – ö 😀'.encode() in fast
+
+
+def test_stdlib_honours_ensure_ascii(app, monkeypatch):
+    monkeypatch.setattr(server, 'orjson', None)
+    assert app.json.dumps({'title': 'é'}) == '{"title":"é"}'
+    assert app.json.dumps({'title': 'é'}, ensure_ascii=True) == '{"title":"\\u00e9"}'
+
+
+@pytest.mark.parametrize('path, headers', [
+    ('/books/1', {}), ('/library?stream=true', {}), ('/library', {'Accept': 'application/x-ndjson'})])
+def test_endpoints(client, monkeypatch, path, headers):
+    client.post('/books', json=book_payload(title='Émile – ö 😀', author_last_name='Zoë'))
+    fast, stdlib = encode_both(monkeypatch, lambda: client.get(path, headers=headers).get_data())
+    assert fast == stdlib
+    assert 'Émile – ö 😀'.encode() in fast and b'"1965-08-01"' in fast
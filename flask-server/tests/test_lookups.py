@@ -0,0 +1,42 @@
+import pytest
+
+import server
+from conftest import add_books, add_customers
+
+
+@pytest.fixture
+def loan(client):
+    add_books(client, 3)
+    add_customers(client, 2)
+    assert client.post('/transactions', json={
+        'book_id': 2, 'customer_id': 1, 'date_borrowed': '2024-01-01'}).status_code == 201
+
+
+@pytest.mark.parametrize('path, key, found', [
+    ('/books/2', 'book_id', 2),
+    ('/customers/2', 'customer_id', 2),
+    ('/transactions/1', 'transaction_id', 1),
+])
+def test_get_by_id(client, loan, path, key, found):
+    assert client.get(path).get_json()[key] == found
+    missing = client.get(path.rsplit('/', 1)[0] + '/999')
+    assert missing.status_code == 404 and 'error' in missing.get_json()
+
+
+@pytest.mark.parametrize('path, builder', [
+    ('/books/1', 'select_books'),
+    ('/customers/1', 'select_customers'),
+    ('/transactions/1', 'select_transactions'),
+])
+def test_get_by_id_database_error_is_json(client, loan, monkeypatch, path, builder):
+    def fail():
+        raise RuntimeError('database is gone')
+    monkeypatch.setattr(server, builder, fail)
+    response = client.get(path)
+    assert response.status_code == 500
+    assert set(response.get_json()) == {'error'}
+
+
+def test_multi_get(client, loan):
+    assert [b['book_id'] for b in client.get('/books?ids=3,1,3,99').get_json()] == [1, 3]
+    assert client.get('/books?ids=a').status_code == 400
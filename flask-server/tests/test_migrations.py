@@ -0,0 +1,71 @@
+import os
+import subprocess
+import sys
+
+from sqlalchemy import create_engine, text
+
+from server import MIGRATIONS
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_concurrent_first_start_migrates_once(tmp_path):
+    # what `uvicorn asgi:app --workers 4` does against a new sqlite file
+    # when AUTO_MIGRATE is left on: every worker runs create_app() at once
+    path = tmp_path / 'library.sqlite3'
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{path}', AUTO_MIGRATE='true')
+    processes = [subprocess.Popen([sys.executable, '-c', 'from server import create_app; create_app()'],
+                                  cwd=HERE, env=env, stderr=subprocess.PIPE, text=True)
+                 for _ in range(4)]
+    for process in processes:
+        _, stderr = process.communicate(timeout=60)
+        assert process.returncode == 0, stderr
+
+    engine = create_engine(f'sqlite:///{path}')
+    with engine.connect() as conn:
+        versions = conn.execute(text('SELECT version FROM schema_version ORDER BY version')).scalars().all()
+        table_versions = conn.execute(text('SELECT COUNT(*) FROM table_versions')).scalar()
+    engine.dispose()
+    assert versions == [version for version, _, _ in MIGRATIONS]
+    assert table_versions == 3
+
+
+def test_upgrade_is_a_no_op_once_applied(app):
+    from server import upgrade_database
+    with app.app_context():
+        assert upgrade_database() == []
+
+
+def schema(conn):
+    rows = conn.execute(text("SELECT type, name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'"))
+    columns = {name: [c for _, c, *_ in conn.execute(text(f'PRAGMA table_info({name})'))]
+               for kind, name in rows if kind == 'table'}
+    indexes = set(conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'")).scalars())
+    return columns, indexes
+
+
+def test_each_version_is_one_schema(tmp_path):
+    # stepping a new database up one migration at a time, each version has
+    # the objects its migration describes and nothing from later ones
+    from server import create_app, db, upgrade_database
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'library.sqlite3'}",
+                      'AUTO_MIGRATE': False})
+    with app.app_context():
+        assert upgrade_database(1) == [1]
+        with db.engine.connect() as conn:
+            columns, indexes = schema(conn)
+        assert columns['transactions'] == [
+            'transaction_id', 'book_id', 'customer_id', 'date_borrowed', 'date_returned']
+        assert set(columns) == {'authors', 'genres', 'books', 'customers', 'transactions', 'schema_version'}
+        assert indexes >= {'ix_transactions_book_id', 'ix_transactions_customer_id', 'idx_authors_name'}
+        assert not indexes & {'uq_authors_name', 'uq_customers_email', 'idx_transactions_customer_history'}
+
+        for version in range(2, len(MIGRATIONS) + 1):
+            assert upgrade_database(version) == [version]
+            with db.engine.connect() as conn:
+                columns, indexes = schema(conn)
+            assert ('due_date' in columns['transactions']) == (version >= 8)
+            assert ('changes' in columns) == (version >= 5)
+            assert ('uq_customers_email' in indexes) == (version >= 6)
+            assert ('ix_transactions_book_id' in indexes) == (version < 9)
+        db.engine.dispose()
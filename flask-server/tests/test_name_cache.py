@@ -0,0 +1,33 @@
+from conftest import book_payload
+from server import author_ids, genre_ids
+
+
+def test_ids_are_cached_once_committed(client):
+    assert client.post('/books', json=book_payload()).status_code == 201
+    assert author_ids.get(('Frank', 'Herbert')) == 1
+    assert genre_ids.get('fiction') == 1
+
+
+def test_rolled_back_insert_is_not_cached(app, client):
+    # the author and genre are inserted, then the missing book rolls it all back
+    response = client.put('/books/42', json=book_payload(
+        author_first_name='Ursula', author_last_name='Le Guin', genre_name='sf'))
+    assert response.status_code == 404
+    assert author_ids.get(('Ursula', 'Le Guin')) is None
+    assert genre_ids.get('sf') is None
+    assert author_ids.stats()['size'] == 0
+
+    # the next book by her gets a real author row, not a rolled-back id
+    assert client.post('/books', json=book_payload(
+        author_first_name='Ursula', author_last_name='Le Guin')).status_code == 201
+    book = client.get('/books/1').get_json()
+    assert book['author'] == {'first_name': 'Ursula', 'last_name': 'Le Guin'}
+
+
+def test_bulk_import_fills_the_cache_after_commit(client):
+    response = client.post('/books/bulk', json=[
+        book_payload(), book_payload(title='Emma', author_first_name='Jane', author_last_name='Austen')])
+    assert response.get_json()['inserted'] == 2
+    assert author_ids.get(('Jane', 'Austen')) is not None
+    assert client.post('/books/bulk', json=[book_payload()]).get_json()['inserted'] == 1
+    assert author_ids.stats()['size'] == 2
@@ -0,0 +1,64 @@
+import csv
+import io
+
+import pytest
+
+from conftest import add_books, add_customers
+
+
+@pytest.fixture
+def loans(client):
+    add_books(client, 5)
+    add_customers(client, 2)
+    # due 01-15, 01-29 (explicit), 01-15, 01-20; the last loan is returned
+    for book_id, borrowed, due in ((1, '2024-01-01', None), (2, '2024-01-01', '2024-01-29'),
+                                   (3, '2024-01-01', None), (4, '2024-01-06', None),
+                                   (5, '2024-01-01', None)):
+        body = {'book_id': book_id, 'customer_id': book_id % 2 + 1, 'date_borrowed': borrowed}
+        if due:
+            body['due_date'] = due
+        assert client.post('/transactions', json=body).status_code == 201
+    assert client.post('/transactions/return', json={'transaction_id': 5}).status_code == 200
+
+
+def overdue(client, query=''):
+    response = client.get('/transactions/overdue?' + query)
+    assert response.status_code == 200, response.get_json()
+    return response
+
+
+def test_most_overdue_first(client, loans):
+    rows = overdue(client, 'as_of=2024-02-01').get_json()
+    assert [(r['transaction_id'], r['due_date'], r['days_overdue']) for r in rows] == [
+        (1, '2024-01-15', 17), (3, '2024-01-15', 17), (4, '2024-01-20', 12), (2, '2024-01-29', 3)]
+    assert [r['transaction_id'] for r in overdue(client, 'as_of=2024-01-16').get_json()] == [1, 3]
+    assert overdue(client, 'as_of=2024-01-15').get_json() == []
+
+
+def test_pages_through_ties_on_due_date(client, loans):
+    pages, cursor = [], None
+    while True:
+        response = overdue(client, 'as_of=2024-02-01&limit=1' + (f'&after={cursor}' if cursor else ''))
+        pages.append([r['transaction_id'] for r in response.get_json()])
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            break
+    assert pages == [[1], [3], [4], [2]]
+
+
+@pytest.mark.parametrize('query', ['as_of=2024-13-01', 'limit=0', 'after=NQ', 'after=!!'])
+def test_bad_parameters(client, loans, query):
+    assert client.get('/transactions/overdue?' + query).status_code == 400
+
+
+def test_csv_report(client, loans):
+    response = overdue(client, 'as_of=2024-02-01&format=csv')
+    assert response.mimetype == 'text/csv'
+    assert 'overdue-2024-02-01.csv' in response.headers['Content-Disposition']
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [(r['transaction_id'], r['customer_name'], r['days_overdue']) for r in rows] == [
+        ('1', 'C1 X', '17'), ('3', 'C1 X', '17'), ('4', 'C0 X', '12'), ('2', 'C0 X', '3')]
+
+    accept = client.get('/transactions/overdue?as_of=2024-02-01&limit=2',
+                        headers={'Accept': 'text/csv'})
+    assert len(list(csv.DictReader(io.StringIO(accept.get_data(as_text=True))))) == 2
@@ -0,0 +1,92 @@
+import pytest
+
+from conftest import add_books, add_customers, book_payload
+from server import encode_cursor
+
+
+def walk(client, path, key, limit):
+    """Follow X-Next-Cursor from the first page to the last; one list per page."""
+    pages, cursor = [], None
+    while True:
+        sep = '&' if '?' in path else '?'
+        response = client.get(f'{path}{sep}limit={limit}' + (f'&after={cursor}' if cursor else ''))
+        assert response.status_code == 200, response.get_json()
+        pages.append([row[key] for row in response.get_json()])
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            return pages
+
+
+@pytest.mark.parametrize('limit', [1, 3, 10, 11])
+def test_library_pages_cover_every_book_once(client, limit):
+    add_books(client, 10)
+    pages = walk(client, '/library', 'book_id', limit)
+    assert sum(pages, []) == list(range(1, 11))
+    assert all(len(page) == limit for page in pages[:-1])
+    # the last page is never empty, so no extra round trip
+    assert pages[-1]
+
+
+def test_customers_pages_cover_every_customer_once(client):
+    add_customers(client, 7)
+    assert walk(client, '/customers', 'customer_id', 3) == [[1, 2, 3], [4, 5, 6], [7]]
+
+
+def test_history_pages_through_equal_dates(client):
+    # seven loans on the same day (and two on a later one) for one customer:
+    # the cursor has to break the date ties on transaction_id
+    add_books(client, 9)
+    add_customers(client, 1)
+    for book_id in range(1, 10):
+        borrowed = '2024-01-02' if book_id > 7 else '2024-01-01'
+        assert client.post('/transactions', json={
+            'book_id': book_id, 'customer_id': 1, 'date_borrowed': borrowed}).status_code == 201
+    pages = walk(client, '/customers/1/transactions', 'transaction_id', 2)
+    assert pages == [[9, 8], [7, 6], [5, 4], [3, 2], [1]]
+
+
+def test_filters_combine_and_page(client):
+    add_books(client, 8)
+    client.post('/books', json=book_payload(title='Emma', author_first_name='Jane',
+                                            author_last_name='Austen', genre_name='Romance'))
+    add_customers(client, 1)
+    client.post('/transactions', json={'book_id': 2, 'customer_id': 1, 'date_borrowed': '2024-01-01'})
+
+    def ids(query):
+        return sum(walk(client, '/library?' + query, 'book_id', 2), [])
+
+    assert ids('genre=romance') == [2, 4, 6, 8, 9]
+    assert ids('genre=ROM&availability=true') == [4, 6, 8, 9]
+    assert ids('availability=false') == [2]
+    assert ids('author=jane aus') == [9]
+    assert ids('author=herbert&title=book 1') == [2]
+    assert ids('book_id=1') == [1]
+    assert ids('title=100%') == []
+
+
+@pytest.mark.parametrize('query, error', [
+    ('limit=abc', 'limit must be an integer'),
+    ('limit=0', 'limit must be positive'),
+    ('availability=maybe', "availability must be 'true' or 'false'"),
+    ('after=!!!', 'Invalid cursor'),
+    ('after=bm90IGpzb24', 'Invalid cursor'),                       # "not json"
+    (f"after={encode_cursor('1')}", 'Invalid cursor'),             # wrong type
+    (f"after={encode_cursor('2024-01-01', 3)}", 'Invalid cursor'),  # history cursor
+])
+def test_bad_parameters_are_400(client, query, error):
+    add_books(client, 1)
+    response = client.get('/library?' + query)
+    assert (response.status_code, response.get_json()) == (400, {'error': error})
+
+
+def test_history_rejects_a_library_cursor(client):
+    add_customers(client, 1)
+    response = client.get(f'/customers/1/transactions?after={encode_cursor(3)}')
+    assert (response.status_code, response.get_json()) == (400, {'error': 'Invalid cursor'})
+
+
+def test_limit_is_capped(app, client):
+    app.config['MAX_PAGE_SIZE'] = 4
+    add_books(client, 6)
+    response = client.get('/library?limit=1000')
+    assert len(response.get_json()) == 4 and 'X-Next-Cursor' in response.headers
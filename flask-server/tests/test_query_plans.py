@@ -0,0 +1,87 @@
+import datetime
+
+import pytest
+from sqlalchemy import text, tuple_
+
+from conftest import add_books, add_customers
+from server import Transaction, customer_filters, db, select_customers, select_transactions
+
+
+@pytest.fixture
+def loans(app, client):
+    add_books(client, 10)
+    add_customers(client, 3)
+    for book_id in range(1, 7):
+        response = client.post('/transactions', json={
+            'book_id': book_id, 'customer_id': book_id % 3 + 1, 'date_borrowed': '2024-01-01'})
+        assert response.status_code == 201
+    client.post('/transactions/return/batch', json={'transaction_ids': [1, 2]})
+
+
+def plan(app, query, **params):
+    """The EXPLAIN QUERY PLAN details for `query`, one string per step."""
+    with app.app_context():
+        if not isinstance(query, str):
+            query = str(query.compile(db.engine, compile_kwargs={'literal_binds': True}))
+        return [row[-1] for row in db.session.execute(text('EXPLAIN QUERY PLAN ' + query), params)]
+
+
+def uses_index(steps, table, index):
+    return any(step.startswith(('SEARCH ' + table, 'SCAN ' + table)) and index in step
+               for step in steps)
+
+
+def test_open_loans_use_partial_index(app, loans):
+    steps = plan(app, 'SELECT transaction_id, book_id, customer_id FROM transactions'
+                      ' WHERE date_returned IS NULL ORDER BY date_borrowed')
+    assert uses_index(steps, 'transactions', 'idx_transactions_open_loans'), steps
+    assert not any('TEMP B-TREE' in step for step in steps), steps
+
+
+def test_genre_availability_uses_composite_index(app, loans):
+    steps = plan(app, 'SELECT book_id FROM books WHERE genre_id = :genre_id AND availability = :available',
+                 genre_id=1, available=True)
+    assert uses_index(steps, 'books', 'idx_books_genre_availability'), steps
+
+
+def test_date_range_uses_date_index(app, loans):
+    steps = plan(app, 'SELECT COUNT(*) FROM transactions WHERE date_borrowed BETWEEN :start AND :end',
+                 start='2024-01-01', end='2024-02-01')
+    assert uses_index(steps, 'transactions', 'idx_transactions_date_borrowed'), steps
+
+
+def test_overdue_report_uses_overdue_index(app, loans):
+    # the query /transactions/overdue runs, including its keyset seek
+    query = select_transactions().where(
+        Transaction.date_returned.is_(None),
+        Transaction.due_date < datetime.date(2024, 3, 1),
+        tuple_(Transaction.due_date, Transaction.transaction_id) > (datetime.date(2024, 1, 1), 3),
+    ).order_by(Transaction.due_date, Transaction.transaction_id)
+    steps = plan(app, query)
+    assert uses_index(steps, 'transactions', 'idx_transactions_overdue'), steps
+    assert not any('TEMP B-TREE' in step for step in steps), steps
+
+
+@pytest.mark.parametrize('column, index', [
+    (Transaction.customer_id, 'idx_transactions_customer_history'),
+    (Transaction.book_id, 'idx_transactions_book_history'),
+])
+def test_loan_history_uses_history_index(app, loans, column, index):
+    # the query the /customers/<id>/transactions and /books/<id>/transactions pages run
+    query = select_transactions().where(
+        column == 1,
+        tuple_(Transaction.date_borrowed, Transaction.transaction_id) < (datetime.date(2024, 6, 1), 100),
+    ).order_by(Transaction.date_borrowed.desc(), Transaction.transaction_id.desc()).limit(20)
+    steps = plan(app, query)
+    assert uses_index(steps, 'transactions', index), steps
+    assert not any('TEMP B-TREE' in step for step in steps), steps
+
+
+@pytest.mark.parametrize('query, index', [
+    ({'q': 'jo'}, 'idx_customers_first_name'),
+    ({'email': 'john.'}, 'uq_customers_email'),
+])
+def test_customer_prefix_search_seeks_an_index(app, loans, query, index):
+    with app.app_context():
+        steps = plan(app, select_customers().where(*customer_filters(query)))
+    assert any(step.startswith('SEARCH customers') and index in step for step in steps), steps
@@ -0,0 +1,91 @@
+import time
+
+import pytest
+
+from conftest import add_books, book_payload
+from server import ResponseCache, library_cache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    return now
+
+
+def cache_stats(client):
+    return client.get('/cache/stats').get_json()['library']
+
+
+def test_second_get_is_a_hit(client):
+    add_books(client, 3)
+    before = cache_stats(client)
+    first = client.get('/library')
+    second = client.get('/library')
+    assert (first.headers['X-Cache'], second.headers['X-Cache']) == ('MISS', 'HIT')
+    assert second.get_data() == first.get_data() and second.mimetype == 'application/json'
+    after = cache_stats(client)
+    assert (after['hits'] - before['hits'], after['misses'] - before['misses'], after['size']) == (1, 1, 1)
+
+
+def test_query_strings_are_cached_separately(client):
+    add_books(client, 3)
+    first = client.get('/library?limit=2')
+    assert client.get('/library?genre=fiction').headers['X-Cache'] == 'MISS'
+    again = client.get('/library?limit=2')
+    assert again.headers['X-Cache'] == 'HIT'
+    # the paging header is replayed with the body
+    assert again.headers['X-Next-Cursor'] == first.headers['X-Next-Cursor']
+
+
+def test_write_invalidates(client):
+    add_books(client, 2)
+    client.get('/library')
+    assert client.put('/books/1', json=book_payload(title='Dune Messiah')).status_code == 200
+    response = client.get('/library')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert response.get_json()[0]['title'] == 'Dune Messiah'
+    assert client.get('/library').headers['X-Cache'] == 'HIT'
+
+
+def test_entries_expire(client, clock):
+    add_books(client, 1)
+    client.get('/library')
+    clock[0] += library_cache.ttl - 1
+    assert client.get('/library').headers['X-Cache'] == 'HIT'
+    clock[0] += 1
+    assert client.get('/library').headers['X-Cache'] == 'MISS'
+
+
+def test_least_recently_used_is_evicted(client, monkeypatch):
+    monkeypatch.setattr(library_cache, 'maxsize', 2)
+    add_books(client, 3)
+    for query in ('limit=1', 'limit=2', 'limit=1', 'limit=3'):
+        client.get('/library?' + query)
+    assert cache_stats(client)['size'] == 2
+    assert client.get('/library?limit=1').headers['X-Cache'] == 'HIT'
+    assert client.get('/library?limit=2').headers['X-Cache'] == 'MISS'
+
+
+def test_errors_and_streams_are_not_cached(client):
+    add_books(client, 1)
+    assert client.get('/library?limit=0').status_code == 400
+    assert client.get('/library?limit=0').headers['X-Cache'] == 'MISS'
+    streamed = client.get('/library?stream=true')
+    assert streamed.is_streamed and 'X-Cache' not in streamed.headers
+    assert cache_stats(client)['size'] == 0
+
+
+def test_response_cache(clock):
+    cache = ResponseCache(maxsize=2, ttl=10)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1       # a is now the most recently used
+    cache.set('c', 3)
+    assert (cache.get('b'), cache.get('a'), cache.get('c')) == (None, 1, 3)
+
+    clock[0] += 10
+    assert cache.get('a') is None
+    assert cache.stats() == {'hits': 3, 'misses': 2, 'size': 1, 'maxsize': 2}
+    cache.clear()
+    assert cache.stats()['size'] == 0
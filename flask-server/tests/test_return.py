@@ -0,0 +1,57 @@
+import datetime
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+import server
+from conftest import add_books, add_customers
+
+
+@pytest.fixture
+def loan(client):
+    add_books(client, 1)
+    add_customers(client, 1)
+    assert client.post('/transactions', json={
+        'book_id': 1, 'customer_id': 1, 'date_borrowed': '2024-01-01'}).status_code == 201
+
+
+def test_return_frees_the_book_and_logs_both_rows(client, loan):
+    since = client.get('/changes?since=0').get_json()['next']
+    response = client.post('/transactions/return', json={'transaction_id': 1})
+    assert (response.status_code, response.get_json()) == (200, {'message': 'Book returned successfully'})
+    assert client.get('/transactions/1').get_json()['date_returned'] == datetime.date.today().isoformat()
+    assert client.get('/books/1').get_json()['availability'] is True
+    changes = client.get(f'/changes?since={since}').get_json()
+    assert (changes['transactions']['updated'], changes['books']['updated']) == ([1], [1])
+
+
+@pytest.mark.parametrize('body, status, error', [
+    ({'transaction_id': 7}, 404, 'Transaction not found'),
+    ({}, 400, 'transaction_id must be an integer id'),
+    ({'transaction_id': '1'}, 400, 'transaction_id must be an integer id'),
+    (None, 400, 'transaction_id must be an integer id'),
+])
+def test_bad_returns(client, loan, body, status, error):
+    response = client.post('/transactions/return', json=body)
+    assert (response.status_code, response.get_json()) == (status, {'error': error})
+    assert client.get('/books/1').get_json()['availability'] is False
+
+
+def test_second_return_is_rejected(client, loan):
+    client.post('/transactions/return', json={'transaction_id': 1})
+    client.post('/transactions', json={'book_id': 1, 'customer_id': 1, 'date_borrowed': '2024-02-01'})
+    response = client.post('/transactions/return', json={'transaction_id': 1})
+    assert (response.status_code, response.get_json()) == (400, {'error': 'Book already returned'})
+    # the book's newer loan is untouched
+    assert client.get('/books/1').get_json()['availability'] is False
+
+
+def test_database_error_rolls_back(client, loan, monkeypatch):
+    def fail(*tables):
+        raise OperationalError('UPDATE table_versions ...', {}, Exception('disk I/O error'))
+    monkeypatch.setattr(server, 'commit_changes', fail)
+    response = client.post('/transactions/return', json={'transaction_id': 1})
+    assert (response.status_code, response.get_json()) == (500, {'error': 'Failed to return book'})
+    monkeypatch.undo()
+    assert client.get('/transactions/1').get_json()['date_returned'] is None
+    assert client.get('/books/1').get_json()['availability'] is False
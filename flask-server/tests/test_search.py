@@ -0,0 +1,50 @@
+from sqlalchemy import text
+
+from conftest import book_payload
+from server import db
+
+
+def titles(client, q):
+    response = client.get('/library/search', query_string={'q': q})
+    assert response.status_code == 200, response.get_json()
+    return [b['title'] for b in response.get_json()]
+
+
+def test_search_matches_title_and_author_prefixes(client):
+    client.post('/books', json=book_payload())
+    client.post('/books', json=book_payload(title='Émile', author_first_name='Jean-Jacques',
+                                            author_last_name='Rousseau'))
+    assert titles(client, 'dun herb') == ['Dune']
+    assert titles(client, 'emile') == ['Émile']      # diacritics are folded
+    assert titles(client, 'rous') == ['Émile']
+    assert titles(client, 'dune rousseau') == []
+    assert titles(client, '"') == []
+    assert client.get('/library/search').status_code == 400
+
+
+def test_triggers_keep_the_index_in_sync(app, client):
+    client.post('/books', json=book_payload())
+    assert titles(client, 'dune') == ['Dune']
+
+    client.put('/books/1', json=book_payload(title='Children of Dune'))
+    assert titles(client, 'children') == ['Children of Dune']
+
+    # a new author on the book is picked up by books_fts_au
+    client.put('/books/1', json=book_payload(author_first_name='Brian', author_last_name='Herbert'))
+    assert titles(client, 'brian') == ['Dune']
+    assert titles(client, 'frank') == []
+
+    # renaming the author itself goes through authors_fts_au
+    with app.app_context():
+        db.session.execute(text("UPDATE authors SET first_name = 'B.' WHERE first_name = 'Brian'"))
+        db.session.commit()
+    assert titles(client, 'brian') == []
+    assert titles(client, 'b herbert') == ['Dune']
+
+    client.delete('/books/1')
+    assert titles(client, 'dune') == []
+
+
+def test_bulk_import_is_indexed(client):
+    client.post('/books/bulk', json=[book_payload(title=f'Volume {i}') for i in range(3)])
+    assert sorted(titles(client, 'volume')) == ['Volume 0', 'Volume 1', 'Volume 2']
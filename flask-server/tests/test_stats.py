@@ -0,0 +1,89 @@
+import datetime
+
+import pytest
+
+from conftest import add_books, add_customers, book_payload
+
+TODAY = datetime.date.today().isoformat()
+
+
+@pytest.fixture
+def loans(client):
+    # books 1-4 at 10 (fiction, romance, fiction, romance), book 5 at 25 in
+    # a differently-cased 'Romance' genre
+    add_books(client, 4)
+    client.post('/books', json=book_payload(title='Emma', author_first_name='Jane',
+                                            author_last_name='Austen', genre_name='Romance', price=25))
+    add_customers(client, 2)
+    # 1: open and overdue, 2: returned, 3: open and not yet due, 4: returned
+    for book_id, customer_id, borrowed in ((1, 1, '2024-01-01'), (2, 2, '2024-01-01'),
+                                           (3, 1, TODAY), (5, 2, '2024-02-01')):
+        assert client.post('/transactions', json={
+            'book_id': book_id, 'customer_id': customer_id, 'date_borrowed': borrowed}).status_code == 201
+    for transaction_id in (2, 4):
+        assert client.post('/transactions/return', json={'transaction_id': transaction_id}).status_code == 200
+
+
+def stats(client, query=''):
+    response = client.get('/stats?' + query)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def test_totals(client, loans):
+    assert stats(client) == {
+        'books': {'count': 5, 'avg_price': 13.0, 'checked_out': 2,
+                  'by_genre': {'fiction': 2, 'romance': 3}},
+        'transactions': {'count': 4, 'returned': 2, 'outstanding': 2},
+    }
+    assert [r['transaction_id'] for r in client.get('/transactions/overdue').get_json()] == [1]
+
+
+def test_empty_library(client):
+    assert stats(client) == {
+        'books': {'count': 0, 'avg_price': 0.0, 'checked_out': 0, 'by_genre': {}},
+        'transactions': {'count': 0, 'returned': 0, 'outstanding': 0},
+    }
+
+
+def test_filters_narrow_each_figure(client, loans):
+    fiction = stats(client, 'genre=fiction')
+    assert fiction['books'] == {'count': 2, 'avg_price': 10.0, 'checked_out': 2, 'by_genre': {'fiction': 2}}
+    assert fiction['transactions']['count'] == 4
+
+    assert stats(client, 'availability=true&author=austen')['books']['count'] == 1
+    assert stats(client, 'customer_id=1')['transactions'] == {'count': 2, 'returned': 0, 'outstanding': 2}
+    assert stats(client, f'date_returned={TODAY}')['transactions'] == {
+        'count': 2, 'returned': 2, 'outstanding': 0}
+
+    # book_id is a filter on both sides
+    by_book = stats(client, 'book_id=5')
+    assert by_book['books']['count'] == 1
+    assert by_book['transactions'] == {'count': 1, 'returned': 1, 'outstanding': 0}
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('customer_id=2', [2, 4]),
+    ('book_id=3', [3]),
+    ('transaction_id=1', [1]),
+    ('date_borrowed=2024-01-01', [1, 2]),
+    (f'date_returned={TODAY}', [2, 4]),
+    ('ids=4,1,4', [1, 4]),
+    ('customer_id=1&date_borrowed=2024-01-01', [1]),
+    ('date_borrowed=1999-01-01', []),
+])
+def test_transaction_filters(client, loans, query, expected):
+    response = client.get('/transactions?' + query)
+    assert response.status_code == 200
+    assert sorted(t['transaction_id'] for t in response.get_json()) == expected
+
+
+@pytest.mark.parametrize('path', ['/stats', '/transactions'])
+@pytest.mark.parametrize('query, error', [
+    ('date_borrowed=2024-13-01', 'date_borrowed must be a YYYY-MM-DD date'),
+    ('date_returned=yesterday', 'date_returned must be a YYYY-MM-DD date'),
+    ('ids=1,x', 'ids must be a comma-separated list of integer ids'),
+])
+def test_bad_filters_are_400(client, path, query, error):
+    response = client.get(f'{path}?{query}')
+    assert (response.status_code, response.get_json()) == (400, {'error': error})
@@ -0,0 +1,75 @@
+import csv
+import io
+import json
+
+import pytest
+
+from conftest import add_books, add_customers
+
+NDJSON = {'Accept': 'application/x-ndjson'}
+
+
+@pytest.fixture
+def app(app):
+    # small batches so the rows span several chunks
+    app.config['STREAM_BATCH_SIZE'] = 2
+    return app
+
+
+@pytest.fixture
+def loans(client):
+    add_books(client, 5)
+    add_customers(client, 2)
+    for book_id in range(1, 6):
+        assert client.post('/transactions', json={
+            'book_id': book_id, 'customer_id': book_id % 2 + 1, 'date_borrowed': '2024-01-01'}).status_code == 201
+
+
+@pytest.mark.parametrize('path', ['/library', '/customers', '/transactions'])
+def test_stream_true_is_the_same_json_array(client, loans, path):
+    response = client.get(path + '?stream=true')
+    assert response.is_streamed and response.mimetype == 'application/json'
+    assert json.loads(response.get_data()) == client.get(path).get_json()
+
+
+@pytest.mark.parametrize('path, key', [
+    ('/library', 'book_id'), ('/customers', 'customer_id'), ('/transactions', 'transaction_id')])
+def test_ndjson_is_one_object_per_line(client, loans, path, key):
+    response = client.get(path, headers=NDJSON)
+    assert response.is_streamed and response.mimetype == 'application/x-ndjson'
+    body = response.get_data(as_text=True)
+    assert body.endswith('\n')
+    rows = [json.loads(line) for line in body.splitlines()]
+    assert rows == client.get(path).get_json()
+    assert len({row[key] for row in rows}) == len(rows)
+
+
+def test_stream_respects_filters_and_limit(client, loans):
+    rows = json.loads(client.get('/library?stream=true&genre=fiction&limit=2').get_data())
+    assert [b['book_id'] for b in rows] == [1, 3]
+
+
+def test_empty_stream_is_valid(client):
+    assert client.get('/library?stream=true').get_data() == b'[]'
+    assert client.get('/library', headers=NDJSON).get_data() == b''
+
+
+def test_csv_spans_batches(client, loans):
+    response = client.get('/transactions/overdue?as_of=2024-03-01&format=csv')
+    assert response.is_streamed and response.mimetype == 'text/csv'
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [r['transaction_id'] for r in rows] == ['1', '2', '3', '4', '5']
+
+
+@pytest.mark.parametrize('query, headers', [('?stream=true', {}), ('', NDJSON)])
+def test_streamed_responses_revalidate(client, loans, query, headers):
+    first = client.get('/library' + query, headers=headers)
+    etag = first.headers['ETag']
+    # the json and ndjson forms of the same listing are different bodies
+    assert etag != client.get('/library').headers['ETag']
+
+    again = client.get('/library' + query, headers=dict(headers, **{'If-None-Match': etag}))
+    assert again.status_code == 304 and again.get_data() == b''
+    client.post('/transactions/return', json={'transaction_id': 1})
+    changed = client.get('/library' + query, headers=dict(headers, **{'If-None-Match': etag}))
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
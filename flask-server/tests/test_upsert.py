@@ -0,0 +1,58 @@
+import threading
+
+from sqlalchemy import text
+
+from conftest import book_payload
+from server import db, migrate_unique_names
+
+
+def count(app, table):
+    with app.app_context():
+        return db.session.execute(text(f'SELECT COUNT(*) FROM {table}')).scalar()
+
+
+def test_concurrent_writes_create_one_author_and_genre(app):
+    # every thread names the same new author and genre at the same moment
+    threads, statuses = 8, []
+    barrier = threading.Barrier(threads)
+
+    def worker(n):
+        client = app.test_client()
+        barrier.wait()
+        statuses.append(client.post('/books', json=book_payload(title=f'Book {n}')).status_code)
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+    assert statuses == [201] * threads
+    assert count(app, 'authors') == 1 and count(app, 'genres') == 1
+
+
+def test_existing_names_are_reused(app, client):
+    client.post('/books', json=book_payload())
+    client.post('/books/bulk', json=[book_payload(title='Children of Dune'),
+                                     book_payload(author_first_name='Brian', genre_name='fiction')])
+    client.put('/books/1', json=book_payload(genre_name='sf'))
+    assert count(app, 'authors') == 2 and count(app, 'genres') == 2
+
+
+def test_migration_folds_duplicate_names(app, client):
+    client.post('/books', json=book_payload())
+    with app.app_context():
+        # a database from before the unique indexes, with a duplicate of each
+        db.session.execute(text('DROP INDEX uq_authors_name'))
+        db.session.execute(text('DROP INDEX uq_genres_name'))
+        db.session.execute(text("INSERT INTO authors (first_name, last_name) VALUES ('Frank', 'Herbert')"))
+        db.session.execute(text("INSERT INTO genres (name) VALUES ('fiction')"))
+        db.session.execute(text("""
+            INSERT INTO books (title, author_id, genre_id, published_date, price, availability)
+            VALUES ('Dune Messiah', 2, 2, '1969-01-01', 5, 1)
+        """))
+        db.session.commit()
+
+        migrate_unique_names()
+        assert db.session.execute(text('SELECT DISTINCT author_id, genre_id FROM books')).all() == [(1, 1)]
+    assert count(app, 'authors') == 1 and count(app, 'genres') == 1
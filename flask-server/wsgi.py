@@ -0,0 +1,10 @@
+"""Production entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Each worker imports this module after the fork, so every worker gets its
+own app, engine and connection pool.
+"""
+from server import create_app
+
+app = create_app()